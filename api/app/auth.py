@@ -1,15 +1,37 @@
 import os
+import time
+import hashlib
+import threading
 import jwt
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from .db import get_db
+from .db import ReadOnlySessionLocal
 from .models import User
 from passlib.hash import pbkdf2_sha256
 
 JWT_SECRET = os.getenv("JWT_SECRET", "trocar")
 JWT_EXPIRES_MINUTES = int(os.getenv("JWT_EXPIRES_MINUTES", "1440"))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "30"))
+
+# Cache de tokens já decodificados: chave = sha256(token)[:16] -> (payload, expira_em)
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=JWT_CACHE_TTL)
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+# Identidade do usuário autenticado: (uid, sha256(token)[:16]) -> CurrentUser
+_USER_CACHE: TTLCache = TTLCache(maxsize=5_000, ttl=int(os.getenv("USER_CACHE_TTL", "60")))
+_USER_CACHE_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Identidade leve (desanexada da sessão) entregue às rotas autenticadas."""
+    id: int
+    email: str
 
 def hash_password(p: str) -> str:
     return pbkdf2_sha256.hash(p)
@@ -20,6 +42,9 @@ def verify_password(p: str, hashed: str) -> bool:
     except Exception:
         return False
 
+# Hash de referência para logins com e-mail inexistente (mantém o custo do verify)
+DUMMY_HASH = hash_password(os.urandom(16).hex())
+
 def create_token(user_id: int) -> str:
     payload = {
         "sub": user_id,
@@ -34,16 +59,71 @@ def decode_token(token: str) -> dict:
     """Decode JWT token - can be imported by main.py"""
     return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(auth_scheme),
-                     db: Session = Depends(get_db)) -> User:
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+def decode_token_cached(token: str) -> dict:
+    """
+    Igual a decode_token, mas reaproveita o payload por até JWT_CACHE_TTL segundos.
+    A entrada nunca vive além do "exp" do próprio token.
+    """
+    key = _token_key(token)
+    now = time.time()
+    with _TOKEN_CACHE_LOCK:
+        hit = _TOKEN_CACHE.get(key)
+    if hit is not None:
+        payload, expires_at = hit
+        if now < expires_at:
+            return payload
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE.pop(key, None)
+
+    payload = decode_token(token)
+    expires_at = now + JWT_CACHE_TTL
+    exp = payload.get("exp")
+    if exp is not None:
+        expires_at = min(expires_at, float(exp))
+    if expires_at > now:
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE[key] = (payload, expires_at)
+    return payload
+
+def load_current_user(db: Session | None, uid: int, token: str) -> CurrentUser | None:
+    """
+    Resolve o usuário do token, consultando o banco só quando não está em cache.
+    Sem db, usa uma sessão READ ONLY própria, devolvida ao pool logo após a consulta.
+    """
+    key = (uid, _token_key(token))
+    with _USER_CACHE_LOCK:
+        cached = _USER_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    # só id/email: não traz password_hash e afins do banco
+    stmt = select(User.id, User.email).where(User.id == uid)
+    if db is None:
+        with ReadOnlySessionLocal() as ro:
+            row = ro.execute(stmt).first()
+    else:
+        row = db.execute(stmt).first()
+    if row is None:
+        return None
+    current = CurrentUser(id=row.id, email=row.email)
+    with _USER_CACHE_LOCK:
+        _USER_CACHE[key] = current
+    return current
+
+def get_current_user(creds: HTTPAuthorizationCredentials = Depends(auth_scheme)) -> CurrentUser:
+    # Sem Depends(get_db): a rota não segura uma segunda conexão (read-write) até o fim
+    # do request só para um SELECT de usuário que quase sempre sai do cache
     token = creds.credentials
     try:
-        data = decode_token(token)
-        uid = data.get("sub")
+        data = decode_token_cached(token)
+        uid = int(data.get("sub"))
     except Exception:
         raise HTTPException(401, "Invalid token")
 
-    user = db.get(User, uid)
+    user = load_current_user(None, uid, token)
     if not user:
         raise HTTPException(401, "User not found")
     return user
@@ -1,11 +1,102 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-DB_URL = os.getenv("DB_URL", "sqlite:///./dev.db")
-connect_args = {"check_same_thread": False} if DB_URL.startswith("sqlite") else {}
-engine = create_engine(DB_URL, echo=False, future=True, connect_args=connect_args)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+def _psycopg_url(url: str) -> str:
+    """Postgres sempre pelo psycopg (v3); aceita DSNs antigos com +psycopg2 ou sem driver."""
+    u = make_url(url)
+    if u.get_backend_name() == "postgresql":
+        return u.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+    return url
+
+
+DB_URL = _psycopg_url(os.getenv("DB_URL", "sqlite:///./dev.db"))
+DB_NULL_POOL = os.getenv("DB_NULL_POOL", "false").lower() == "true"
+
+if DB_URL.startswith("sqlite"):
+    connect_args = {"check_same_thread": False}
+else:
+    # psycopg prepara no servidor as queries executadas N vezes na mesma conexão (pula o Parse).
+    # PgBouncer em transaction mode não suporta prepared statements: desliga junto com o NullPool.
+    connect_args = {"prepare_threshold": None if DB_NULL_POOL else int(os.getenv("DB_PREPARE_THRESHOLD", "5"))}
+
+
+def _pool_kwargs(url: str, pool_size: int, max_overflow: int) -> dict:
+    """Dimensionamento do pool (Postgres). SQLite fica com o pool padrão do dialeto."""
+    if url.startswith("sqlite"):
+        return {}
+    # Atrás do PgBouncer (transaction mode) o pool é dele: não empilhar dois pools
+    if DB_NULL_POOL:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "3600")),
+        "pool_pre_ping": True,
+    }
+
+
+# Orçamento de conexões por processo = engine síncrona + engine async (cada uma tem o seu
+# pool). Com N workers do uvicorn o pico no Postgres é
+# N * (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW),
+# que precisa caber no max_connections. A async só atende leituras: pool menor.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "5"))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "5"))
+
+
+engine = create_engine(DB_URL, echo=False, future=True, connect_args=connect_args, **_pool_kwargs(DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW))
+if DB_URL.startswith("sqlite"):
+    # SQLite só respeita FKs (e ON DELETE CASCADE) com o pragma ligado por conexão
+    @event.listens_for(engine, "connect")
+    def _sqlite_enable_fks(dbapi_conn, _):
+        dbapi_conn.execute("PRAGMA foreign_keys=ON")
+
+# expire_on_commit=False: objetos seguem utilizáveis após o commit (com eager_defaults
+# nos models, os valores gerados pelo banco já vieram no flush)
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+
+
+def _async_url(url: str) -> str:
+    """Mesmo banco do DB_URL, trocando o driver síncrono pelo equivalente async."""
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    # postgresql+psycopg serve aos dois: o create_async_engine usa o modo async do psycopg
+    return url
+
+
+# Engine async para endpoints de leitura: a espera pelo banco não ocupa thread do pool
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL") or _async_url(DB_URL)
+async_engine = create_async_engine(
+    ASYNC_DB_URL,
+    echo=False,
+    connect_args={} if ASYNC_DB_URL.startswith("sqlite") else connect_args,
+    **_pool_kwargs(ASYNC_DB_URL, DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW),
+)
+if ASYNC_DB_URL.startswith("sqlite"):
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _sqlite_enable_fks_async(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+# Endpoints só de leitura: transação READ ONLY no Postgres (sem xid/WAL, aceita hot standby).
+# Mesmo pool; o SQLAlchemy desfaz o read-only quando a conexão volta ao pool.
+ReadOnlySessionLocal = sessionmaker(
+    bind=engine.execution_options(postgresql_readonly=True),
+    autoflush=False, autocommit=False, expire_on_commit=False, future=True,
+)
+AsyncReadOnlySessionLocal = async_sessionmaker(
+    bind=async_engine.execution_options(postgresql_readonly=True),
+    autoflush=False, expire_on_commit=False,
+)
 
 def get_db():
     db = SessionLocal()
@@ -13,3 +104,14 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_db_ro():
+    db = ReadOnlySessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db_ro():
+    async with AsyncReadOnlySessionLocal() as db:
+        yield db
@@ -0,0 +1,71 @@
+# app/history.py
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from cachetools import LRUCache
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Message
+
+# Quantas mensagens recentes guardamos por thread (a LLM usa no máximo OPENAI_MAX_HISTORY)
+LLM_CTX_MAX = int(os.getenv("LLM_CTX_MAX", "64"))
+
+
+# Quantas mensagens já em cache a busca incremental relê. Os ids vêm de uma sequence, mas a
+# ordem de commit não é a de id: uma mensagem com id menor que a última vista pode ficar
+# visível depois (duas requisições gravando na mesma thread). Reler a cauda com
+# sobreposição e deduplicar por id pega essas linhas atrasadas.
+HISTORY_OVERLAP = int(os.getenv("HISTORY_OVERLAP", "8"))
+
+
+class _ThreadHistory:
+    __slots__ = ("messages",)
+
+    def __init__(self) -> None:
+        # (id, role, content) em ordem de id
+        self.messages: Deque[Tuple[int, str, str]] = deque(maxlen=LLM_CTX_MAX)
+
+
+# thread_id -> últimas LLM_CTX_MAX mensagens (LRU para limitar memória)
+THREAD_HIST: LRUCache = LRUCache(maxsize=int(os.getenv("THREAD_HIST_CACHE_SIZE", "2048")))
+_LOCK = threading.Lock()
+
+
+def thread_history(db: Session, thread_id: int) -> List[Dict[str, str]]:
+    """
+    Histórico da thread no formato da LLM ({"role", "content"}), em ordem cronológica.
+
+    Na primeira chamada carrega só as últimas LLM_CTX_MAX mensagens; depois relê a partir
+    da HISTORY_OVERLAP-ésima mensagem mais recente do cache e mescla por id (webhooks de
+    outros workers, respostas humanas e commits fora de ordem continuam aparecendo).
+    """
+    with _LOCK:
+        entry = THREAD_HIST.get(thread_id)
+        anchor = None
+        if entry is not None and entry.messages:
+            anchor = entry.messages[-min(HISTORY_OVERLAP, len(entry.messages))][0]
+
+    cols = select(Message.id, Message.role, Message.content).where(Message.thread_id == thread_id)
+    if anchor is None:
+        rows = db.execute(cols.order_by(Message.id.desc()).limit(LLM_CTX_MAX)).all()
+        rows.reverse()
+        entry = entry or _ThreadHistory()
+    else:
+        rows = db.execute(cols.where(Message.id >= anchor).order_by(Message.id.asc())).all()
+
+    with _LOCK:
+        # requisições concorrentes podem trazer as mesmas linhas: dedup por id
+        merged = {mid: (mid, role, content) for mid, role, content in entry.messages}
+        for mid, role, content in rows:
+            merged[mid] = (mid, role, content)
+        entry.messages = deque(sorted(merged.values()), maxlen=LLM_CTX_MAX)
+        THREAD_HIST[thread_id] = entry
+        return [{"role": role, "content": content} for _, role, content in entry.messages]
+
+
+def invalidate_thread_history(thread_id: int) -> None:
+    with _LOCK:
+        THREAD_HIST.pop(thread_id, None)
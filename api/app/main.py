@@ -1,10 +1,15 @@
 # app/main.py
 import os
 import json
+import functools
 import jwt
+import orjson
 import asyncio
 import logging
-from typing import Dict, Set, Optional, List
+from typing import Any, Awaitable, Callable, Dict, Set, Optional, List, Tuple
+
+import anyio
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
 
 from fastapi import (
     FastAPI,
@@ -17,17 +22,17 @@ from fastapi import (
     Header,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, ORJSONResponse, Response
 from fastapi.exception_handlers import http_exception_handler
 from starlette.status import HTTP_401_UNAUTHORIZED
 
-from sqlalchemy import func, case, select, text
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, func, case, delete, distinct, select, text
+from sqlalchemy.orm import Session, joinedload, raiseload
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
-from .db import get_db, engine, SessionLocal
-from .models import Base, User, Thread, Message, Contact, ContactTag, ContactNote, ContactReminder
+from .db import get_db, get_db_ro, engine, async_engine, SessionLocal
+from .models import Base, User, Thread, Message, Contact, ContactTag, ContactNote, ContactReminder, MESSAGE_ROLES, MESSAGE_ROLE_FALLBACK
 from .schemas import (
     LoginRequest,
     LoginResponse,
@@ -36,18 +41,36 @@ from .schemas import (
     ThreadCreate,
     ThreadUpdate,
 )
-from .auth import create_token, verify_password, hash_password, get_current_user
+from .auth import (
+    create_token,
+    verify_password,
+    hash_password,
+    get_current_user,
+    load_current_user,
+    CurrentUser,
+    DUMMY_HASH,
+    JWT_SECRET,
+)
 
 from .services.llm_service import run_llm
 from .providers import twilio as twilio_provider
 from .providers import meta as meta_provider
 from .realtime import hub
+from .history import thread_history, invalidate_thread_history
+
+# -----------------------------
+# Config (lida uma vez no import)
+# -----------------------------
+DEBUG = bool(os.getenv("DEBUG"))
+JWT_ALGS = ["HS256"]
+META_VERIFY_TOKEN = os.getenv("META_VERIFY_TOKEN")
+INBOX_OWNER_EMAIL = os.getenv("INBOX_OWNER_EMAIL", "dev@local.com")
 
 # -----------------------------
 # App & CORS
 # -----------------------------
 Base.metadata.create_all(bind=engine)
-app = FastAPI(title=os.getenv("APP_NAME", "MVP Chat"))
+app = FastAPI(title=os.getenv("APP_NAME", "MVP Chat"), default_response_class=ORJSONResponse)
 
 _raw = os.getenv("CORS_ALLOW_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000")
 ALLOWED_ORIGINS = [o.strip() for o in _raw.split(",") if o.strip()]
@@ -95,7 +118,7 @@ async def all_exception_handler(request: Request, exc: Exception):
     
     return JSONResponse(
         status_code=500,
-        content={"detail": str(exc) if os.getenv("DEBUG") else "internal_error"},
+        content={"detail": str(exc) if DEBUG else "internal_error"},
         headers={
             "Access-Control-Allow-Origin": cors_origin,
             "Access-Control-Allow-Credentials": "true",
@@ -186,6 +209,95 @@ def _fix_messages_is_human(db: Session) -> None:
     """))
     db.commit()
 
+_JSONB_COLUMNS = [
+    ("threads", "meta"),
+    ("contacts", "most_bought_products"),
+]
+
+def _fix_jsonb_columns(db: Session) -> None:
+    """
+    Converte colunas criadas como json (texto) para jsonb.
+    Idempotente: colunas que já são jsonb são ignoradas.
+    """
+    for table, column in _JSONB_COLUMNS:
+        db.execute(text(f"""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1
+                    FROM information_schema.columns
+                    WHERE table_name = '{table}' AND column_name = '{column}' AND data_type = 'json'
+                ) THEN
+                    ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb;
+                END IF;
+            END $$;
+        """))
+    db.commit()
+
+def _fix_message_role_enum(db: Session) -> None:
+    """
+    Converte messages.role (varchar) para o ENUM message_role.
+    Idempotente: se a coluna já é o ENUM, não faz nada (nem toca na tabela).
+
+    Valores fora do vocabulário são logados e regravados como MESSAGE_ROLE_FALLBACK antes
+    da conversão, senão o cast falharia e a coluna ficaria varchar para sempre.
+
+    ⚠️ O ALTER ... TYPE reescreve a tabela inteira sob ACCESS EXCLUSIVE lock: leituras e
+    escritas em messages ficam bloqueadas até o fim. Roda uma vez só, no primeiro boot
+    após o deploy; em bases grandes, prefira rodar numa janela de manutenção.
+    """
+    log = logging.getLogger("uvicorn.error")
+    labels = ", ".join(f"'{r}'" for r in MESSAGE_ROLES)
+
+    db.execute(text(f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'message_role') THEN
+                CREATE TYPE message_role AS ENUM ({labels});
+            END IF;
+        END $$;
+    """))
+    data_type = db.execute(text("""
+        SELECT data_type
+        FROM information_schema.columns
+        WHERE table_name = 'messages' AND column_name = 'role'
+    """)).scalar()
+    if data_type is None or data_type == "USER-DEFINED":
+        db.commit()
+        return
+
+    unknown = db.execute(text(f"""
+        SELECT role, COUNT(*) FROM messages WHERE role NOT IN ({labels}) GROUP BY role
+    """)).all()
+    if unknown:
+        log.warning(
+            f"[MIGRATION] messages.role fora de {MESSAGE_ROLES}: "
+            f"{dict((r, n) for r, n in unknown)}; regravando como '{MESSAGE_ROLE_FALLBACK}'"
+        )
+        db.execute(
+            text(f"UPDATE messages SET role = :fallback WHERE role NOT IN ({labels})"),
+            {"fallback": MESSAGE_ROLE_FALLBACK},
+        )
+
+    log.info("[MIGRATION] convertendo messages.role para ENUM message_role (reescreve a tabela)")
+    db.execute(text("ALTER TABLE messages ALTER COLUMN role TYPE message_role USING role::message_role;"))
+    db.commit()
+
+def _fix_contact_tags_user_id(db: Session) -> None:
+    """
+    Garante contact_tags.user_id (dono do contato, denormalizado) preenchido e NOT NULL.
+    Idempotente: pode rodar várias vezes.
+    """
+    db.execute(text("ALTER TABLE contact_tags ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);"))
+    db.execute(text("""
+        UPDATE contact_tags t
+        SET user_id = c.user_id
+        FROM contacts c
+        WHERE c.id = t.contact_id AND t.user_id IS NULL;
+    """))
+    db.execute(text("ALTER TABLE contact_tags ALTER COLUMN user_id SET NOT NULL;"))
+    db.commit()
+
 def _fix_contacts_table(db: Session) -> None:
     """
     Garante que a tabela contacts tenha todas as colunas necessárias.
@@ -402,11 +514,12 @@ def _fix_contacts_table(db: Session) -> None:
     
     db.commit()
 
-def _update_existing_contacts(db: Session) -> None:
+def _update_existing_contacts(db: Session) -> Set[int]:
     """
     Atualiza contatos existentes que têm nomes genéricos (ex: "WhatsApp 1114")
     ou que não têm nome, tentando extrair um nome melhor do thread.
     Também cria contatos para threads que ainda não têm.
+    Retorna os user_ids cujos contatos mudaram (para invalidar o cache da lista).
     """
     from .models import Contact, Thread
     
@@ -418,6 +531,7 @@ def _update_existing_contacts(db: Session) -> None:
     # Filtra threads sem contato
     threads_without_contacts = [t for t in all_threads if t.id not in existing_contact_thread_ids]
     created_count = 0
+    changed_users: Set[int] = set()
     for thread in threads_without_contacts:
         name = None
         
@@ -451,6 +565,7 @@ def _update_existing_contacts(db: Session) -> None:
         )
         db.add(contact)
         created_count += 1
+        changed_users.add(thread.user_id)
     
     if created_count > 0:
         db.commit()
@@ -514,10 +629,79 @@ def _update_existing_contacts(db: Session) -> None:
             if new_name and new_name != contact.name:
                 contact.name = new_name
                 updated_count += 1
+                changed_users.add(contact.user_id)
     
     if updated_count > 0:
         db.commit()
         print(f"✅ Atualizados {updated_count} contatos com nomes melhores")
+    return changed_users
+
+# (tabela, coluna, tabela referenciada) que devem apagar em cascata
+_CASCADE_FKS = [
+    ("messages", "thread_id", "threads"),
+    ("contacts", "thread_id", "threads"),
+    ("contact_tags", "contact_id", "contacts"),
+    ("contact_notes", "contact_id", "contacts"),
+    ("contact_reminders", "contact_id", "contacts"),
+]
+
+def _fix_cascade_fks(db: Session) -> None:
+    """
+    Recria as FKs de _CASCADE_FKS com ON DELETE CASCADE (create_all não altera
+    tabelas existentes). Idempotente: FKs que já cascateiam são ignoradas.
+    """
+    for table, column, ref in _CASCADE_FKS:
+        db.execute(text(f"""
+            DO $$
+            DECLARE
+                fk TEXT;
+            BEGIN
+                SELECT c.conname INTO fk
+                FROM pg_constraint c
+                JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY (c.conkey)
+                WHERE c.contype = 'f'
+                  AND c.conrelid = '{table}'::regclass
+                  AND a.attname = '{column}'
+                  AND c.confdeltype <> 'c'
+                LIMIT 1;
+
+                IF fk IS NOT NULL THEN
+                    EXECUTE format('ALTER TABLE {table} DROP CONSTRAINT %I', fk);
+                    ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey
+                        FOREIGN KEY ({column}) REFERENCES {ref}(id) ON DELETE CASCADE;
+                END IF;
+            END $$;
+        """))
+    db.commit()
+
+# Índices de coluna única cobertos pelo prefixo de um índice composto (ou que nenhuma
+# consulta usa): só custam escrita
+_REDUNDANT_INDEXES = [
+    "ix_messages_thread_id",  # coberto por ix_msg_thread_id_desc
+    "ix_contact_reminders_contact_id",  # coberto por ix_reminders_contact_due
+    "ix_threads_user_id",  # coberto por ix_threads_user_id_desc
+    "ix_contacts_user_id",  # coberto por ix_contacts_user_id_desc
+    "ix_contact_tags_user_id",  # nenhuma consulta começa por contact_tags.user_id
+]
+
+def _drop_redundant_indexes(db: Session) -> None:
+    """Remove índices que saíram dos models por redundância. Idempotente."""
+    for name in _REDUNDANT_INDEXES:
+        db.execute(text(f"DROP INDEX IF EXISTS {name};"))
+    db.commit()
+
+def _ensure_indexes() -> None:
+    """
+    create_all só cria índices junto com tabelas novas; aqui criamos os que
+    faltarem em tabelas já existentes. Idempotente: pode rodar várias vezes.
+    """
+    log = logging.getLogger("uvicorn.error")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                log.warning(f"[BOOT] índice {index.name} não criado: {e}")
 
 @app.on_event("startup")
 def seed_user_and_migrate():
@@ -527,6 +711,12 @@ def seed_user_and_migrate():
         _fix_threads_meta(db)
         _fix_messages_is_human(db)
         _fix_contacts_table(db)  # Garante que contacts tenha todas as colunas
+        _fix_contact_tags_user_id(db)
+        _fix_jsonb_columns(db)
+        _fix_message_role_enum(db)
+        _fix_cascade_fks(db)
+        _drop_redundant_indexes(db)
+        _ensure_indexes()
         _update_existing_contacts(db)  # Atualiza contatos existentes
         
         # seed
@@ -537,11 +727,16 @@ def seed_user_and_migrate():
             u = User(email="dev@local.com", password_hash=hash_password("123"))
             db.add(u)
             db.commit()
+            _owner_id_for.cache_clear()
         # migração leve
         _fix_threads_meta(db)
     finally:
         db.close()
 
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
 # Endpoint manual caso queira rodar o fix on-demand
 @app.get("/debug/fix-threads-meta")
 def debug_fix_threads_meta(db: Session = Depends(get_db)):
@@ -566,7 +761,8 @@ def debug_fix_contacts_table(db: Session = Depends(get_db)):
 def debug_update_contacts_names(db: Session = Depends(get_db)):
     """Endpoint para atualizar nomes de contatos existentes manualmente"""
     try:
-        _update_existing_contacts(db)
+        for user_id in _update_existing_contacts(db):
+            crm.invalidate_contacts_cache(user_id)
         return {"ok": True, "message": "Contatos atualizados com sucesso"}
     except Exception as e:
         db.rollback()
@@ -576,9 +772,13 @@ def debug_update_contacts_names(db: Session = Depends(get_db)):
 # Auth
 # -----------------------------
 @app.post("/auth/login", response_model=LoginResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    u = db.execute(select(User).where(User.email == payload.email)).scalar_one_or_none()
-    if not u or not verify_password(payload.password, u.password_hash):
+async def login(payload: LoginRequest, db: Session = Depends(get_db)):
+    u = await asyncio.to_thread(
+        lambda: db.execute(select(User).where(User.email == payload.email)).scalar_one_or_none()
+    )
+    # pbkdf2 é caro: roda fora do loop e também para e-mails inexistentes (mesmo tempo de resposta)
+    ok = await asyncio.to_thread(verify_password, payload.password, u.password_hash if u else DUMMY_HASH)
+    if not u or not ok:
         raise HTTPException(401, "Invalid credentials")
     return LoginResponse(token=create_token(u.id))
 
@@ -587,36 +787,43 @@ class MeOut(BaseModel):
     email: str
 
 @app.get("/me", response_model=MeOut)
-def me(user: User = Depends(get_current_user)):
+async def me(user: CurrentUser = Depends(get_current_user)):
     return MeOut(id=user.id, email=user.email)
 
 # -----------------------------
 # SSE infra (tempo real)
 # -----------------------------
-SUBS: Dict[int, Set[asyncio.Queue]] = {}
+# thread_id -> tupla imutável de streams (copy-on-write).
+# Só subscribe/unsubscribe pegam o lock; o broadcast lê o dict sem travar.
+SUBS: Dict[int, Tuple[MemoryObjectSendStream, ...]] = {}
 SUBS_LOCK = asyncio.Lock()
 
-async def _subscribe(thread_id: int) -> asyncio.Queue:
-    q: asyncio.Queue = asyncio.Queue()
+# Eventos pendentes por cliente SSE; um cliente travado perde eventos em vez de segurar o broadcast
+SSE_BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", "256"))
+
+async def _subscribe(thread_id: int) -> Tuple[MemoryObjectSendStream, MemoryObjectReceiveStream]:
+    send, recv = anyio.create_memory_object_stream(max_buffer_size=SSE_BUFFER_SIZE)
     async with SUBS_LOCK:
-        SUBS.setdefault(thread_id, set()).add(q)
-    return q
+        SUBS[thread_id] = SUBS.get(thread_id, ()) + (send,)
+    return send, recv
 
-async def _unsubscribe(thread_id: int, q: asyncio.Queue):
+async def _unsubscribe(thread_id: int, send: MemoryObjectSendStream):
     async with SUBS_LOCK:
-        if thread_id in SUBS and q in SUBS[thread_id]:
-            SUBS[thread_id].remove(q)
-            if not SUBS[thread_id]:
-                SUBS.pop(thread_id, None)
+        remaining = tuple(s for s in SUBS.get(thread_id, ()) if s is not send)
+        if remaining:
+            SUBS[thread_id] = remaining
+        else:
+            SUBS.pop(thread_id, None)
+    send.close()
 
 async def _broadcast(thread_id: int, payload: dict):
-    async with SUBS_LOCK:
-        queues = list(SUBS.get(thread_id, set()))
-    for q in queues:
+    # SSE: entrega sem await (nenhum assinante lento bloqueia os demais)
+    for send in SUBS.get(thread_id, ()):
         try:
-            await q.put(payload)
+            send.send_nowait(payload)
         except Exception:
-            pass
+            pass  # buffer cheio (WouldBlock) ou stream já fechado
+    # WS: envios concorrentes dentro do hub
     try:
         await hub.broadcast(str(thread_id), payload)
     except Exception:
@@ -624,16 +831,14 @@ async def _broadcast(thread_id: int, payload: dict):
 
 # tenta usar decode_token se existir; senão, fallback
 def _decode_token_fallback(token: str) -> dict:
-    # Use the same JWT_SECRET as auth.py for consistency
-    secret = os.getenv("JWT_SECRET", "trocar")
-    return jwt.decode(token, secret, algorithms=["HS256"])
+    return jwt.decode(token, JWT_SECRET, algorithms=JWT_ALGS)
 
 try:
-    from .auth import decode_token as _decode_token
+    from .auth import decode_token_cached as _decode_token
 except Exception:
     _decode_token = _decode_token_fallback  # type: ignore
 
-def _user_from_query_token(db: Session, token: str) -> User:
+def _user_from_query_token(db: Session, token: str) -> CurrentUser:
     if not token:
         raise HTTPException(HTTP_401_UNAUTHORIZED, "missing token")
     try:
@@ -641,7 +846,7 @@ def _user_from_query_token(db: Session, token: str) -> User:
         uid = int(payload["sub"])
     except Exception:
         raise HTTPException(HTTP_401_UNAUTHORIZED, "invalid token")
-    u = db.get(User, uid)
+    u = load_current_user(db, uid, token)
     if not u:
         raise HTTPException(HTTP_401_UNAUTHORIZED, "invalid user")
     return u
@@ -656,92 +861,10 @@ def _iso(dt):
         return None
 
 def _serialize_thread(t: Thread, db: Session = None) -> dict:
-    # Busca o contato associado à thread (se existir)
-    # Se não existir, cria automaticamente
-    contact_name = None
-    try:
-        # Tenta acessar o relacionamento (pode estar carregado via joinedload)
-        if hasattr(t, "contact") and t.contact is not None:
-            contact_name = t.contact.name
-        elif db is not None:
-            # Se não estiver carregado e tivermos acesso ao db, busca diretamente
-            from .models import Contact
-            contact = db.query(Contact).filter(Contact.thread_id == t.id).first()
-            if not contact:
-                # Cria o contato automaticamente se não existir
-                # Tenta extrair um nome melhor do metadata ou título
-                name = None
-                
-                # Primeiro, tenta pegar do metadata (pode vir do WhatsApp)
-                if hasattr(t, 'meta') and t.meta:
-                    if isinstance(t.meta, dict):
-                        name = t.meta.get('name') or t.meta.get('profile_name') or t.meta.get('display_name')
-                    elif isinstance(t.meta, str):
-                        try:
-                            import json
-                            meta_dict = json.loads(t.meta)
-                            name = meta_dict.get('name') or meta_dict.get('profile_name') or meta_dict.get('display_name')
-                        except:
-                            pass
-                
-                # Se não encontrou no metadata, tenta do título
-                if not name and t.title:
-                    # Se o título contém "WhatsApp" seguido de números, não usa como nome
-                    # Caso contrário, usa o título completo (pode ser um nome real)
-                    if not t.title.startswith("WhatsApp"):
-                        # Se não começa com "WhatsApp", provavelmente é um nome real
-                        name = t.title
-                
-                # Se ainda não tem nome, usa o número do telefone como fallback
-                if not name and t.external_user_phone:
-                    # Extrai os últimos 4 dígitos
-                    phone_clean = t.external_user_phone.replace("whatsapp:", "").replace("+", "").strip()
-                    if phone_clean:
-                        name = f"Contato {phone_clean[-4:]}"
-                
-                contact = Contact(
-                    thread_id=t.id,
-                    user_id=t.user_id,
-                    phone=t.external_user_phone,
-                    name=name or f"Contato {t.id}",  # Fallback final
-                )
-                db.add(contact)
-                db.commit()
-                db.refresh(contact)
-            
-            if contact:
-                contact_name = contact.name
-                
-                # Se o contato tem um nome genérico, tenta atualizar
-                if contact_name and (contact_name.startswith("WhatsApp") or contact_name.startswith("Contato ")):
-                    # Tenta atualizar o nome do contato
-                    new_name = None
-                    
-                    # Tenta do metadata
-                    if hasattr(t, 'meta') and t.meta:
-                        if isinstance(t.meta, dict):
-                            new_name = t.meta.get('name') or t.meta.get('profile_name') or t.meta.get('display_name')
-                        elif isinstance(t.meta, str):
-                            try:
-                                import json
-                                meta_dict = json.loads(t.meta)
-                                new_name = meta_dict.get('name') or meta_dict.get('profile_name') or meta_dict.get('display_name')
-                            except:
-                                pass
-                    
-                    # Se não encontrou no metadata, tenta do título
-                    if not new_name and t.title and not t.title.startswith("WhatsApp"):
-                        new_name = t.title
-                    
-                    # Se encontrou um nome melhor, atualiza
-                    if new_name and new_name != contact.name:
-                        contact.name = new_name
-                        db.commit()
-                        db.refresh(contact)
-                        contact_name = contact.name
-    except Exception:
-        # Se houver qualquer erro, ignora e continua sem o nome
-        pass
+    # Nome do contato associado (se existir). Só leitura: serializar não grava no banco;
+    # o contato é criado sob demanda em GET /contacts/thread/{id} ou via webhook.
+    contact = t.contact
+    contact_name = contact.name if contact is not None else None
     
     # Busca a última mensagem da thread (para preview na sidebar)
     last_message = None
@@ -780,13 +903,21 @@ def _serialize_thread(t: Thread, db: Session = None) -> dict:
 # -----------------------------
 # SSE stream
 # -----------------------------
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+SSE_PING = b"event: ping\ndata: ok\n\n"
+SSE_KEEPALIVE = b"event: keepalive\ndata: {}\n\n"
+
 @app.get("/threads/{thread_id}/stream")
 async def stream_thread(
     thread_id: int,
     request: Request,
     token: Optional[str] = Query(None, description="JWT de acesso (ou use Authorization: Bearer)"),
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_ro),
 ):
     if not token and authorization:
         if authorization.lower().startswith("bearer "):
@@ -795,66 +926,79 @@ async def stream_thread(
         raise HTTPException(HTTP_401_UNAUTHORIZED, "missing token")
 
     user = _user_from_query_token(db, token)
-    t = db.get(Thread, thread_id)
-    if not t or t.user_id != user.id:
+    if _thread_owner(db, thread_id) != user.id:
         raise HTTPException(404, "Thread not found")
 
-    q = await _subscribe(thread_id)
+    send, recv = await _subscribe(thread_id)
 
     async def event_gen():
         try:
-            yield "event: ping\ndata: ok\n\n"
+            yield SSE_PING
             while True:
                 if await request.is_disconnected():
                     break
                 try:
-                    payload = await asyncio.wait_for(q.get(), timeout=30)
-                    data = json.dumps(payload, ensure_ascii=False)
-                    yield f"data: {data}\n\n"
+                    batch = [await asyncio.wait_for(recv.receive(), timeout=30)]
                 except asyncio.TimeoutError:
-                    yield "event: keepalive\ndata: {}\n\n"
+                    yield SSE_KEEPALIVE
+                    continue
+                # drena o que já estiver na fila e envia tudo numa única escrita
+                while True:
+                    try:
+                        batch.append(recv.receive_nowait())
+                    except anyio.WouldBlock:
+                        break
+                yield b"".join(b"data: " + orjson.dumps(p) + b"\n\n" for p in batch)
         finally:
-            await _unsubscribe(thread_id, q)
+            await _unsubscribe(thread_id, send)
+            recv.close()
 
-    headers = {
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive",
-        "X-Accel-Buffering": "no",
-    }
-    return StreamingResponse(event_gen(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(event_gen(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 # -----------------------------
 # Threads (sem response_model)
 # -----------------------------
-@app.get("/threads")
-def list_threads(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    from sqlalchemy.orm import joinedload
-    rows = (
-        db.query(Thread)
-        .options(joinedload(Thread.contact))  # Carrega o contato junto
-        .where(Thread.user_id == user.id)
-        .order_by(Thread.id.desc())
-        .all()
-    )
+# Montada uma vez no import; o cache de compilação do SQLAlchemy reaproveita o SQL
+_THREAD_OWNER = select(Thread.user_id).where(Thread.id == bindparam("tid"))
+
+def _thread_owner(db: Session, thread_id: int) -> Optional[int]:
+    """user_id dono da thread (None se não existir), sem carregar a Thread inteira."""
+    return db.execute(_THREAD_OWNER, {"tid": thread_id}).scalar()
+
+_OWNED_THREAD = (
+    select(Thread)
+    .options(joinedload(Thread.contact))
+    .where(Thread.id == bindparam("tid"), Thread.user_id == bindparam("uid"))
+)
+
+_THREADS_BY_USER = (
+    select(Thread)
+    # Carrega o contato junto; qualquer outro lazy load (N+1) vira erro em vez de lentidão
+    .options(joinedload(Thread.contact), raiseload("*"))
+    .where(Thread.user_id == bindparam("uid"))
+    .order_by(Thread.id.desc())
+)
+
+def _list_threads(db: Session, user_id: int) -> list[dict]:
+    rows = db.execute(_THREADS_BY_USER, {"uid": user_id}).unique().scalars().all()
     # Serializa threads (inclui última mensagem)
     return [_serialize_thread(t, db) for t in rows]
 
+@app.get("/threads")
+async def list_threads(
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db_ro),
+):
+    # Driver síncrono: roda fora do event loop para não prender o threadpool
+    return await asyncio.to_thread(_list_threads, db, user.id)
+
 @app.get("/threads/{thread_id}")
 def get_thread(
     thread_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db_ro),
 ):
-    from sqlalchemy.orm import joinedload
-    t = (
-        db.query(Thread)
-        .options(joinedload(Thread.contact))
-        .filter(Thread.id == thread_id, Thread.user_id == user.id)
-        .first()
-    )
+    t = db.execute(_OWNED_THREAD, {"tid": thread_id, "uid": user.id}).scalar()
     if not t:
         raise HTTPException(404, "Thread not found")
     return _serialize_thread(t, db)
@@ -862,29 +1006,22 @@ def get_thread(
 @app.post("/threads")
 def create_thread(
     body: ThreadCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     t = Thread(user_id=user.id, title=body.title or "Nova conversa")
     db.add(t)
     db.commit()
-    db.refresh(t)
     return _serialize_thread(t, db)
 
 @app.patch("/threads/{thread_id}")
 def update_thread_endpoint(
     thread_id: int,
     body: ThreadUpdate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    from sqlalchemy.orm import joinedload
-    t = (
-        db.query(Thread)
-        .options(joinedload(Thread.contact))
-        .filter(Thread.id == thread_id, Thread.user_id == user.id)
-        .first()
-    )
+    t = db.execute(_OWNED_THREAD, {"tid": thread_id, "uid": user.id}).scalar()
     if not t:
         raise HTTPException(404, "Thread not found")
 
@@ -903,52 +1040,56 @@ def update_thread_endpoint(
 
     db.add(t)
     db.commit()
-    db.refresh(t)
     return _serialize_thread(t, db)
 
 @app.delete("/threads/{thread_id}", status_code=204)
 def delete_thread(
-    thread_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    thread_id: int, user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)
 ):
-    t = db.get(Thread, thread_id)
-    if not t or t.user_id != user.id:
-        raise HTTPException(404, "Thread not found")
-    db.query(Message).filter(Message.thread_id == thread_id).delete()
-    db.delete(t)
+    # mensagens/contato saem junto via ON DELETE CASCADE: um único DELETE
+    deleted = db.execute(
+        delete(Thread)
+        .where(Thread.id == thread_id, Thread.user_id == user.id)
+        .returning(Thread.id)
+        .execution_options(synchronize_session=False)
+    ).first()
     db.commit()
+    if not deleted:
+        raise HTTPException(404, "Thread not found")
+    invalidate_thread_history(thread_id)
+    crm.invalidate_contacts_cache(user.id)
     return
 
 # -----------------------------
 # Messages
 # -----------------------------
+MESSAGES_ADAPTER = TypeAdapter(List[MessageRead])
+
+# Só as colunas que o MessageRead serializa (sem hidratar entidades ORM)
+_MESSAGES_BY_THREAD = (
+    select(Message.id, Message.role, Message.content, Message.created_at)
+    .where(Message.thread_id == bindparam("tid"))
+    .order_by(Message.id.asc())
+)
+
 @app.get("/threads/{thread_id}/messages", response_model=List[MessageRead])
 def get_messages(
-    thread_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    thread_id: int, user: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db_ro)
 ):
-    t = db.get(Thread, thread_id)
-    if not t or t.user_id != user.id:
+    if _thread_owner(db, thread_id) != user.id:
         raise HTTPException(404, "Thread not found")
-    msgs = (
-        db.query(Message)
-        .filter(Message.thread_id == thread_id)
-        .order_by(Message.id.asc())
-        .all()
+    msgs = db.execute(_MESSAGES_BY_THREAD, {"tid": thread_id}).all()
+    # valida a lista inteira de uma vez e já serializa em JSON (pydantic-core)
+    return Response(
+        content=MESSAGES_ADAPTER.dump_json(MESSAGES_ADAPTER.validate_python(msgs, from_attributes=True)),
+        media_type="application/json",
     )
-    return [
-        MessageRead(
-            id=m.id,
-            role=m.role,
-            content=m.content,
-            created_at=m.created_at,
-        )
-        for m in msgs
-    ]
 
 @app.post("/threads/{thread_id}/messages", response_model=MessageRead)
 async def send_message(
     thread_id: int,
     body: MessageCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     t = db.get(Thread, thread_id)
@@ -958,7 +1099,6 @@ async def send_message(
     m_user = Message(thread_id=thread_id, role="user", content=body.content)
     db.add(m_user)
     db.commit()
-    db.refresh(m_user)
 
     await _broadcast(
         thread_id,
@@ -981,13 +1121,7 @@ async def send_message(
             created_at=m_user.created_at,
         )
 
-    hist = [
-        {"role": m.role, "content": m.content}
-        for m in db.query(Message)
-        .filter(Message.thread_id == thread_id)
-        .order_by(Message.id.asc())
-        .all()
-    ]
+    hist = thread_history(db, thread_id)
 
     await _broadcast(thread_id, {"type": "assistant.typing.start"})
     reply = await run_llm(body.content, thread_history=hist, takeover=False)
@@ -1004,7 +1138,6 @@ async def send_message(
     m_assist = Message(thread_id=thread_id, role="assistant", content=reply)
     db.add(m_assist)
     db.commit()
-    db.refresh(m_assist)
 
     await _broadcast(
         thread_id,
@@ -1026,6 +1159,155 @@ async def send_message(
         created_at=m_assist.created_at,
     )
 
+# -----------------------------
+# Webhooks WhatsApp - helpers
+# -----------------------------
+@functools.lru_cache(maxsize=8)
+def _owner_id_for(email: str) -> int:
+    """
+    Id do usuário dono da inbox (cria se não existir). Constante durante o
+    processo, então fica em cache; o seed limpa o cache ao criar usuários.
+    """
+    with SessionLocal() as s:
+        uid = s.execute(select(User.id).where(User.email == email)).scalar_one_or_none()
+        if uid is None:
+            owner = User(email=email, password_hash=hash_password("123"))
+            s.add(owner)
+            s.commit()
+            uid = owner.id
+        return uid
+
+def _resolve_owner_thread(
+    db: Session,
+    owner_id: int,
+    phone: str,
+    profile_name: Optional[str],
+    meta_data: dict,
+) -> Tuple[Thread, bool]:
+    """
+    Encontra (ou cria) a thread do telefone e o contato para o dono da inbox.
+    Tudo na transação corrente: usa flush() para obter ids e deixa o commit
+    para o chamador (um único commit por mensagem recebida).
+    Retorna (thread, contato_alterado).
+    """
+    t = (
+        db.query(Thread)
+        .filter(Thread.user_id == owner_id, Thread.external_user_phone == phone)
+        .order_by(Thread.id.desc())
+        .first()
+    )
+
+    if not t:
+        # Usa o nome do perfil se disponível, senão usa o padrão
+        title = profile_name if profile_name else f"WhatsApp {phone[-4:]}"
+        t = Thread(
+            user_id=owner_id,
+            title=title,
+            external_user_phone=phone,
+            meta=meta_data if meta_data else None
+        )
+        db.add(t)
+        db.flush()
+    elif profile_name:
+        # Atualiza o metadata e título se tiver nome do perfil
+        current_meta = {}
+        if t.meta:
+            if isinstance(t.meta, dict):
+                current_meta = t.meta.copy()
+            elif isinstance(t.meta, str):
+                try:
+                    current_meta = json.loads(t.meta)
+                except:
+                    pass
+
+        current_meta.update(meta_data)
+        t.meta = current_meta
+
+        # Atualiza o título se ainda for genérico
+        if t.title.startswith("WhatsApp"):
+            t.title = profile_name
+
+    # Atualiza ou cria o contato com o nome do perfil
+    contact = db.query(Contact).filter(Contact.thread_id == t.id).first()
+    contact_changed = False
+    if contact:
+        if profile_name and (not contact.name or contact.name.startswith("WhatsApp") or contact.name.startswith("Contato ")):
+            contact.name = profile_name
+            contact_changed = True
+    elif profile_name:
+        # Cria o contato com o nome do perfil
+        db.add(Contact(
+            thread_id=t.id,
+            user_id=owner_id,
+            phone=phone,
+            name=profile_name,
+        ))
+        contact_changed = True
+    return t, contact_changed
+
+# Limita quantas respostas da LLM rodam ao mesmo tempo (rajadas de webhooks)
+LLM_SEMAPHORE = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "16")))
+# Mantém referência às tasks em andamento (o loop só guarda weakrefs)
+_BACKGROUND_TASKS: Set[asyncio.Task] = set()
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+
+def _load_history(thread_id: int) -> List[Dict[str, str]]:
+    db = SessionLocal()
+    try:
+        return thread_history(db, thread_id)
+    finally:
+        db.close()
+
+def _save_assistant_message(thread_id: int, content: str) -> int:
+    db = SessionLocal()
+    try:
+        m_assist = Message(thread_id=thread_id, role="assistant", content=content)
+        db.add(m_assist)
+        db.commit()
+        return m_assist.id
+    finally:
+        db.close()
+
+async def _respond_async(
+    thread_id: int,
+    text_in: str,
+    send_reply: Callable[[str], Awaitable[Any]],
+) -> None:
+    """
+    Gera a resposta da LLM para uma mensagem recebida por webhook, salva,
+    transmite via SSE/WS e envia ao cliente. Usa sessões próprias, pois roda
+    depois que a requisição do webhook já terminou.
+    """
+    async with LLM_SEMAPHORE:
+        try:
+            # Driver síncrono: as idas ao banco rodam fora do event loop (até LLM_CONCURRENCY
+            # destas tarefas em paralelo travariam as demais requisições). Cada uma abre e
+            # fecha a sessão na própria thread; nenhuma conexão fica presa durante a LLM.
+            hist = await asyncio.to_thread(_load_history, thread_id)
+
+            await _broadcast(thread_id, {"type": "assistant.typing.start"})
+            try:
+                reply = await run_llm(text_in, thread_history=hist, takeover=False)
+            finally:
+                await _broadcast(thread_id, {"type": "assistant.typing.stop"})
+            if not reply:
+                return
+
+            mid = await asyncio.to_thread(_save_assistant_message, thread_id, reply)
+
+            await _broadcast(
+                thread_id,
+                {"type": "message.created", "message": {"id": mid, "role": "assistant", "content": reply}},
+            )
+
+            await send_reply(reply)
+        except Exception:
+            logging.getLogger("uvicorn.error").exception(f"[WEBHOOK] falha ao responder thread {thread_id}")
+
 # -----------------------------
 # Webhooks WhatsApp - Meta
 # -----------------------------
@@ -1035,8 +1317,7 @@ def meta_verify(
     hub_challenge: str | None = None,
     hub_verify_token: str | None = None,
 ):
-    expected = os.getenv("META_VERIFY_TOKEN")
-    if hub_verify_token == expected:
+    if hub_verify_token == META_VERIFY_TOKEN:
         try:
             return int(hub_challenge or 0)
         except Exception:
@@ -1066,21 +1347,6 @@ async def meta_webhook(req: Request, db: Session = Depends(get_db)):
     except Exception:
         return {"status": "ignored"}
 
-    owner_email = os.getenv("INBOX_OWNER_EMAIL", "dev@local.com")
-    owner = db.query(User).filter(User.email == owner_email).first()
-    if not owner:
-        owner = User(email=owner_email, password_hash=hash_password("123"))
-        db.add(owner)
-        db.commit()
-        db.refresh(owner)
-
-    t = (
-        db.query(Thread)
-        .filter(Thread.user_id == owner.id, Thread.external_user_phone == from_)
-        .order_by(Thread.id.desc())
-        .first()
-    )
-    
     # Prepara o metadata com o nome do perfil se disponível
     meta_data = {}
     if profile_name:
@@ -1088,94 +1354,28 @@ async def meta_webhook(req: Request, db: Session = Depends(get_db)):
         meta_data["profile_name"] = profile_name
     if from_:
         meta_data["wa_id"] = from_
-    
-    if not t:
-        # Usa o nome do perfil se disponível, senão usa o padrão
-        title = profile_name if profile_name else f"WhatsApp {from_[-4:]}"
-        t = Thread(
-            user_id=owner.id, 
-            title=title, 
-            external_user_phone=from_,
-            meta=meta_data if meta_data else None
-        )
-        db.add(t)
-        db.commit()
-        db.refresh(t)
-    else:
-        # Atualiza o metadata e título se tiver nome do perfil
-        if profile_name:
-            import json
-            current_meta = {}
-            if t.meta:
-                if isinstance(t.meta, dict):
-                    current_meta = t.meta.copy()
-                elif isinstance(t.meta, str):
-                    try:
-                        current_meta = json.loads(t.meta)
-                    except:
-                        pass
-            
-            current_meta.update(meta_data)
-            t.meta = current_meta
-            
-            # Atualiza o título se ainda for genérico
-            if t.title.startswith("WhatsApp"):
-                t.title = profile_name
-            
-            db.commit()
-            db.refresh(t)
-    
-    # Atualiza ou cria o contato com o nome do perfil
-    from .models import Contact
-    contact = db.query(Contact).filter(Contact.thread_id == t.id).first()
-    if contact:
-        if profile_name and (not contact.name or contact.name.startswith("WhatsApp") or contact.name.startswith("Contato ")):
-            contact.name = profile_name
-            db.commit()
-    elif profile_name:
-        # Cria o contato com o nome do perfil
-        contact = Contact(
-            thread_id=t.id,
-            user_id=owner.id,
-            phone=from_,
-            name=profile_name,
-        )
-        db.add(contact)
-        db.commit()
+
+    owner_id = _owner_id_for(INBOX_OWNER_EMAIL)
+    t, contact_changed = _resolve_owner_thread(db, owner_id, from_, profile_name, meta_data)
 
     m_user = Message(thread_id=t.id, role="user", content=text_in)
     db.add(m_user)
-    db.commit()
-    db.refresh(m_user)
+    db.flush()
+    thread_id, m_user_id, takeover = t.id, m_user.id, bool(t.human_takeover)
+    db.commit()  # único commit para dono/thread/contato/mensagem
+    if contact_changed:
+        crm.invalidate_contacts_cache(owner_id)
 
     await _broadcast(
-        t.id,
-        {"type": "message.created", "message": {"id": m_user.id, "role": "user", "content": text_in}},
+        thread_id,
+        {"type": "message.created", "message": {"id": m_user_id, "role": "user", "content": text_in}},
     )
 
-    if getattr(t, "human_takeover", False):
+    if takeover:
         return {"status": "ok", "skipped_llm": True}
 
-    hist = [
-        {"role": m.role, "content": m.content}
-        for m in db.query(Message).filter(Message.thread_id == t.id).order_by(Message.id.asc()).all()
-    ]
-
-    await _broadcast(t.id, {"type": "assistant.typing.start"})
-    reply = await run_llm(text_in, thread_history=hist, takeover=False)
-    await _broadcast(t.id, {"type": "assistant.typing.stop"})
-
-    m_assist = Message(thread_id=t.id, role="assistant", content=reply)
-    db.add(m_assist)
-    db.commit()
-    db.refresh(m_assist)
-
-    await _broadcast(
-        t.id,
-        {"type": "message.created", "message": {"id": m_assist.id, "role": "assistant", "content": reply}},
-    )
-
-    await meta_provider.send_text(from_, reply)
+    # LLM + envio rodam em background: o provedor recebe 200 sem esperar a resposta
+    _spawn(_respond_async(thread_id, text_in, lambda reply: meta_provider.send_text(from_, reply)))
     return {"status": "ok"}
 
 # -----------------------------
@@ -1190,21 +1390,6 @@ async def twilio_webhook(req: Request, db: Session = Depends(get_db)):
     # Tenta capturar o nome do perfil do WhatsApp (Twilio pode enviar ProfileName)
     profile_name = form.get("ProfileName") or form.get("Profile Name") or None
 
-    owner_email = os.getenv("INBOX_OWNER_EMAIL", "dev@local.com")
-    owner = db.query(User).filter(User.email == owner_email).first()
-    if not owner:
-        owner = User(email=owner_email, password_hash=hash_password("123"))
-        db.add(owner)
-        db.commit()
-        db.refresh(owner)
-
-    t = (
-        db.query(Thread)
-        .filter(Thread.user_id == owner.id, Thread.external_user_phone == from_)
-        .order_by(Thread.id.desc())
-        .first()
-    )
-    
     # Prepara o metadata com o nome do perfil se disponível
     meta_data = {}
     if profile_name:
@@ -1213,134 +1398,71 @@ async def twilio_webhook(req: Request, db: Session = Depends(get_db)):
     if from_:
         meta_data["wa_id"] = from_
         meta_data["phone"] = from_
-    
-    if not t:
-        # Usa o nome do perfil se disponível, senão usa o padrão
-        title = profile_name if profile_name else f"WhatsApp {from_[-4:]}"
-        t = Thread(
-            user_id=owner.id, 
-            title=title, 
-            external_user_phone=from_,
-            meta=meta_data if meta_data else None
-        )
-        db.add(t)
-        db.commit()
-        db.refresh(t)
-    else:
-        # Atualiza o metadata e título se tiver nome do perfil
-        if profile_name:
-            import json
-            current_meta = {}
-            if t.meta:
-                if isinstance(t.meta, dict):
-                    current_meta = t.meta.copy()
-                elif isinstance(t.meta, str):
-                    try:
-                        current_meta = json.loads(t.meta)
-                    except:
-                        pass
-            
-            current_meta.update(meta_data)
-            t.meta = current_meta
-            
-            # Atualiza o título se ainda for genérico
-            if t.title.startswith("WhatsApp"):
-                t.title = profile_name
-            
-            db.commit()
-            db.refresh(t)
-    
-    # Atualiza ou cria o contato com o nome do perfil
-    from .models import Contact
-    contact = db.query(Contact).filter(Contact.thread_id == t.id).first()
-    if contact:
-        if profile_name and (not contact.name or contact.name.startswith("WhatsApp") or contact.name.startswith("Contato ")):
-            contact.name = profile_name
-            db.commit()
-    elif profile_name:
-        # Cria o contato com o nome do perfil
-        contact = Contact(
-            thread_id=t.id,
-            user_id=owner.id,
-            phone=from_,
-            name=profile_name,
-        )
-        db.add(contact)
-        db.commit()
+
+    owner_id = _owner_id_for(INBOX_OWNER_EMAIL)
+    t, contact_changed = _resolve_owner_thread(db, owner_id, from_, profile_name, meta_data)
 
     m_user = Message(thread_id=t.id, role="user", content=body)
     db.add(m_user)
-    db.commit()
-    db.refresh(m_user)
+    db.flush()
+    thread_id, m_user_id, takeover = t.id, m_user.id, bool(t.human_takeover)
+    db.commit()  # único commit para dono/thread/contato/mensagem
+    if contact_changed:
+        crm.invalidate_contacts_cache(owner_id)
 
     await _broadcast(
-        t.id,
-        {"type": "message.created", "message": {"id": m_user.id, "role": "user", "content": body}},
+        thread_id,
+        {"type": "message.created", "message": {"id": m_user_id, "role": "user", "content": body}},
     )
 
-    if getattr(t, "human_takeover", False):
+    if takeover:
         return {"status": "ok", "skipped_llm": True}
 
-    hist = [
-        {"role": m.role, "content": m.content}
-        for m in db.query(Message).filter(Message.thread_id == t.id).order_by(Message.id.asc()).all()
-    ]
-
-    await _broadcast(t.id, {"type": "assistant.typing.start"})
-    reply = await run_llm(body, thread_history=hist, takeover=False)
-    await _broadcast(t.id, {"type": "assistant.typing.stop"})
-
-    m_assist = Message(thread_id=t.id, role="assistant", content=reply)
-    db.add(m_assist)
-    db.commit()
-    db.refresh(m_assist)
-
-    await _broadcast(
-        t.id,
-        {"type": "message.created", "message": {"id": m_assist.id, "role": "assistant", "content": reply}},
-    )
-
-    await asyncio.to_thread(twilio_provider.send_text, from_, reply, "BOT")
+    # LLM + envio rodam em background: o provedor recebe 200 sem esperar a resposta
+    _spawn(_respond_async(
+        thread_id, body, lambda reply: asyncio.to_thread(twilio_provider.send_text, from_, reply, "BOT")
+    ))
     return {"status": "ok"}
 
 # -----------------------------
 # Stats (dashboard)
 # -----------------------------
-from datetime import timezone, datetime
+from datetime import timezone, datetime, timedelta
 
 @app.get("/stats")
-def stats(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Total de threads do usuário
-    threads_count = (
-        db.query(func.count(Thread.id))
-        .filter(Thread.user_id == user.id)
-        .scalar()
-    ) or 0
-
-    # Contagem de mensagens por role
-    q_msgs = (
-        db.query(
+async def stats(
+    days: Optional[int] = Query(None, ge=1, le=3650, description="Série diária/tempo de resposta só dos últimos N dias"),
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db_ro),
+):
+    return await asyncio.to_thread(_compute_stats, db, user.id, days)
+
+def _compute_stats(db: Session, user_id: int, days: Optional[int] = None) -> dict:
+    # Totais + última atividade numa única consulta (threads sem mensagem entram via outer join)
+    totals = db.execute(
+        select(
+            func.count(distinct(Thread.id)),
             func.sum(case((Message.role == "user", 1), else_=0)),
             func.sum(case((Message.role == "assistant", 1), else_=0)),
             func.count(Message.id),
+            func.max(Message.created_at),
         )
-        .join(Thread, Thread.id == Message.thread_id)
-        .filter(Thread.user_id == user.id)
-    )
-    user_msgs, assistant_msgs, total_msgs = q_msgs.one() if q_msgs else (0, 0, 0)
-    user_msgs = int(user_msgs or 0)
-    assistant_msgs = int(assistant_msgs or 0)
-    total_msgs = int(total_msgs or 0)
-
-    # Última atividade real
-    last_msg = (
-        db.query(Message.created_at)
-        .join(Thread, Thread.id == Message.thread_id)
-        .filter(Thread.user_id == user.id)
-        .order_by(Message.id.desc())
-        .first()
-    )
-    last_activity = last_msg[0] if last_msg else None
+        .select_from(Thread)
+        .outerjoin(Message, Message.thread_id == Thread.id)
+        .where(Thread.user_id == user_id)
+    ).one()
+    threads_count = int(totals[0] or 0)
+    user_msgs = int(totals[1] or 0)
+    assistant_msgs = int(totals[2] or 0)
+    total_msgs = int(totals[3] or 0)
+    last_activity = totals[4]
+
+    # Threads do usuário como semi-join (IN subquery): filtra mensagens sem JOIN/colunas de threads
+    user_thread_ids = select(Thread.id).where(Thread.user_id == user_id)
+    # Recorte por created_at (índice BRIN): sem ele, varre todo o histórico do usuário
+    in_window = [Message.thread_id.in_(user_thread_ids)]
+    if days:
+        in_window.append(Message.created_at >= datetime.utcnow() - timedelta(days=days))
 
     # ------- Mensagens por dia (reais) -------
     # agrupa created_at por dia, separando user x assistant
@@ -1350,8 +1472,7 @@ def stats(user: User = Depends(get_current_user), db: Session = Depends(get_db))
             func.sum(case((Message.role == "user", 1), else_=0)).label("user"),
             func.sum(case((Message.role == "assistant", 1), else_=0)).label("assistant"),
         )
-        .join(Thread, Thread.id == Message.thread_id)
-        .filter(Thread.user_id == user.id)
+        .filter(*in_window)
         .group_by(func.date_trunc("day", Message.created_at))
         .order_by(func.date_trunc("day", Message.created_at).asc())
         .all()
@@ -1375,8 +1496,7 @@ def stats(user: User = Depends(get_current_user), db: Session = Depends(get_db))
     # Obs.: isso é O(n) em cima do histórico do usuário.
     msgs_all = (
         db.query(Message.thread_id, Message.role, Message.created_at)
-        .join(Thread, Thread.id == Message.thread_id)
-        .filter(Thread.user_id == user.id)
+        .filter(*in_window)
         .order_by(Message.thread_id.asc(), Message.id.asc())
         .all()
     )
@@ -1425,8 +1545,7 @@ async def ws_thread(
     try:
         user = _user_from_query_token(db, token)
         # Verify thread belongs to user
-        t = db.get(Thread, int(thread_id))
-        if not t or t.user_id != user.id:
+        if _thread_owner(db, int(thread_id)) != user.id:
             await websocket.close(code=1008, reason="Thread not found or access denied")
             return
     except Exception:
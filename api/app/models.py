@@ -2,12 +2,53 @@
 from __future__ import annotations
 
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, ForeignKey, Text, func
+    Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, Text, Index, func
 )
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy.types import JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import JSON, TypeDecorator
 
-Base = declarative_base()
+class _EagerDefaults:
+    # created_at/updated_at (server_default/onupdate) voltam via RETURNING no próprio
+    # INSERT/UPDATE do flush: nada de db.refresh() (SELECT extra) depois do commit
+    __mapper_args__ = {"eager_defaults": True}
+
+
+Base = declarative_base(cls=_EagerDefaults)
+
+# JSONB no Postgres (binário: sem re-parse a cada leitura, indexável); JSON nos demais
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+# Vocabulário fixo de Message.role: ENUM nativo no Postgres (4 bytes por linha, comparação
+# por OID em vez de texto); nos demais bancos vira VARCHAR. Os valores continuam str no Python.
+MESSAGE_ROLES = ("user", "assistant", "system")
+# Papel usado para valores legados fora do vocabulário (ex.: "agent", mensagens de atendente
+# gravadas antes do is_human): é lado "empresa", como as respostas do bot.
+MESSAGE_ROLE_FALLBACK = "assistant"
+
+
+class MessageRoleType(TypeDecorator):
+    """
+    ENUM message_role tolerante na leitura: o Enum puro levanta LookupError para qualquer
+    valor fora de MESSAGE_ROLES (VARCHAR ainda não migrado, SQLite), derrubando a listagem
+    de mensagens inteira. Aqui esses valores viram MESSAGE_ROLE_FALLBACK.
+    """
+    impl = Enum(*MESSAGE_ROLES, name="message_role", native_enum=True, create_constraint=False)
+    cache_ok = True
+
+    def result_processor(self, dialect, coltype):
+        # Pula o processor do Enum (que valida) e aplica só o fallback
+        def process(value):
+            return self.process_result_value(value, dialect)
+        return process
+
+    def process_result_value(self, value, dialect):
+        if value is None or value in MESSAGE_ROLES:
+            return value
+        return MESSAGE_ROLE_FALLBACK
+
+
+MessageRole = MessageRoleType()
 
 
 class User(Base):
@@ -27,7 +68,8 @@ class Thread(Base):
     id = Column(Integer, primary_key=True)
     external_thread_id = Column(String(255), nullable=True)
     title = Column(String(255), nullable=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # sem index=True: ix_threads_user_id_desc (user_id, id DESC) já serve às buscas por user_id
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
 
     human_takeover = Column(Boolean, default=False, nullable=False)
@@ -38,24 +80,39 @@ class Thread(Base):
     lead_score = Column(Integer, nullable=True)
 
     # ⚠️ Coluna real no banco: "meta"
-    meta = Column(JSON, name="meta", nullable=True)
+    meta = Column(JSONType, name="meta", nullable=True)
 
     user = relationship("User", back_populates="threads")
-    messages = relationship("Message", back_populates="thread", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="thread", cascade="all, delete-orphan", passive_deletes=True)
+    contact = relationship("Contact", back_populates="thread", uselist=False, passive_deletes=True)
+
+    __table_args__ = (
+        # GET /threads: WHERE user_id = ? ORDER BY id DESC
+        Index("ix_threads_user_id_desc", user_id, id.desc()),
+    )
 
 
 class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True)
-    thread_id = Column(Integer, ForeignKey("threads.id"), nullable=False, index=True)
-    role = Column(String(16), nullable=False)  # "user" | "assistant" | "system"
+    # sem index=True: ix_msg_thread_id_desc (thread_id, id DESC) já serve às buscas por thread_id
+    thread_id = Column(Integer, ForeignKey("threads.id", ondelete="CASCADE"), nullable=False)
+    role = Column(MessageRole, nullable=False)  # "user" | "assistant" | "system"
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     is_human = Column(Boolean, default=False, nullable=False)  # Para mensagens enviadas por humanos
 
     thread = relationship("Thread", back_populates="messages")
 
+    __table_args__ = (
+        # histórico/última mensagem por thread: WHERE thread_id = ? ORDER BY id DESC
+        Index("ix_msg_thread_id_desc", thread_id, id.desc()),
+        # janelas de tempo (/stats?days=N): BRIN guarda só min/max por bloco; como as
+        # mensagens chegam em ordem de created_at, poda o histórico quase de graça
+        Index("ix_msg_created_at_brin", created_at, postgresql_using="brin").ddl_if(dialect="postgresql"),
+    )
+
 
 # ================== CRM Models ==================
 class Contact(Base):
@@ -63,8 +120,9 @@ class Contact(Base):
     __tablename__ = "contacts"
 
     id = Column(Integer, primary_key=True)
-    thread_id = Column(Integer, ForeignKey("threads.id"), nullable=False, unique=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    thread_id = Column(Integer, ForeignKey("threads.id", ondelete="CASCADE"), nullable=False, unique=True, index=True)
+    # sem index=True: ix_contacts_user_id_desc (user_id, id DESC) já serve às buscas por user_id
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     # Dados básicos
     name = Column(String(255), nullable=True)
@@ -76,16 +134,21 @@ class Contact(Base):
     total_orders = Column(Integer, default=0, nullable=False)
     total_spent = Column(Integer, default=0, nullable=False)  # em centavos
     average_ticket = Column(Integer, nullable=True)  # em centavos
-    most_bought_products = Column(JSON, nullable=True)  # [{"product": "Cartão", "count": 5}]
+    most_bought_products = Column(JSONType, nullable=True)  # [{"product": "Cartão", "count": 5}]
     
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     last_interaction_at = Column(DateTime, nullable=True)
 
-    thread = relationship("Thread", backref="contact")
-    tags = relationship("ContactTag", back_populates="contact", cascade="all, delete-orphan")
-    notes = relationship("ContactNote", back_populates="contact", cascade="all, delete-orphan", order_by="ContactNote.created_at.desc()")
-    reminders = relationship("ContactReminder", back_populates="contact", cascade="all, delete-orphan")
+    thread = relationship("Thread", back_populates="contact")
+    tags = relationship("ContactTag", back_populates="contact", cascade="all, delete-orphan", passive_deletes=True)
+    notes = relationship("ContactNote", back_populates="contact", cascade="all, delete-orphan", passive_deletes=True, order_by="ContactNote.created_at.desc()")
+    reminders = relationship("ContactReminder", back_populates="contact", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # GET /contacts: WHERE user_id = ? [AND id < ?] ORDER BY id DESC
+        Index("ix_contacts_user_id_desc", user_id, id.desc()),
+    )
 
 
 class ContactTag(Base):
@@ -93,7 +156,10 @@ class ContactTag(Base):
     __tablename__ = "contact_tags"
 
     id = Column(Integer, primary_key=True)
-    contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=False, index=True)
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), nullable=False, index=True)
+    # dono do contato (denormalizado): filtra por usuário sem JOIN em contacts. Sem índice:
+    # as buscas chegam por id/contact_id e user_id é só filtro adicional
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     tag = Column(String(64), nullable=False, index=True)
     created_at = Column(DateTime, server_default=func.now())
 
@@ -105,7 +171,7 @@ class ContactNote(Base):
     __tablename__ = "contact_notes"
 
     id = Column(Integer, primary_key=True)
-    contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=False, index=True)
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
@@ -118,7 +184,8 @@ class ContactReminder(Base):
     __tablename__ = "contact_reminders"
 
     id = Column(Integer, primary_key=True)
-    contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=False, index=True)
+    # sem index=True: ix_reminders_contact_due (contact_id, due_date, id) já serve às buscas por contact_id
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     message = Column(Text, nullable=False)
     due_date = Column(DateTime, nullable=False, index=True)
@@ -126,3 +193,15 @@ class ContactReminder(Base):
     created_at = Column(DateTime, server_default=func.now())
 
     contact = relationship("Contact", back_populates="reminders")
+
+    __table_args__ = (
+        # GET /contacts/{id}/reminders: WHERE contact_id = ? ORDER BY due_date, id
+        Index("ix_reminders_contact_due", contact_id, due_date, id),
+        # ?completed=false (só pendentes): índice parcial, não cresce com o histórico concluído
+        Index(
+            "ix_reminders_contact_pending",
+            contact_id, due_date, id,
+            postgresql_where=completed.is_(False),
+            sqlite_where=completed.is_(False),
+        ),
+    )
@@ -2,8 +2,8 @@
 from typing import Dict, Set, Any
 from fastapi import WebSocket
 from collections import defaultdict
-import json
 import asyncio
+import orjson
 
 class ThreadHub:
     def __init__(self):
@@ -22,14 +22,12 @@ class ThreadHub:
                 self.rooms[thread_id].remove(ws)
 
     async def broadcast(self, thread_id: str, event: dict[str, Any]):
+        data = orjson.dumps(event).decode()
+        sockets = list(self.rooms.get(thread_id, set()))
+        # envia para todos ao mesmo tempo: um socket lento não atrasa os outros
+        results = await asyncio.gather(*(ws.send_text(data) for ws in sockets), return_exceptions=True)
         # remove sockets quebrados
-        dead = []
-        data = json.dumps(event, ensure_ascii=False)
-        for ws in list(self.rooms.get(thread_id, set())):
-            try:
-                await ws.send_text(data)
-            except Exception:
-                dead.append(ws)
+        dead = [ws for ws, r in zip(sockets, results) if isinstance(r, Exception)]
         if dead:
             async with self.lock:
                 for ws in dead:
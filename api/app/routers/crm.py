@@ -1,29 +1,76 @@
 # app/routers/crm.py
+import hashlib
+import os
+import threading
 from datetime import datetime
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from typing import Dict, List, Optional
+from cachetools import TTLCache
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload, raiseload
+from sqlalchemy import bindparam, delete, exists, func, insert, literal, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 
-from app.db import get_db
-from app.models import Contact, ContactTag, ContactNote, ContactReminder, Thread, Message, User
+from app.db import get_db, get_async_db_ro, ReadOnlySessionLocal
+from app.models import Contact, ContactTag, ContactNote, ContactReminder, Thread, Message
 from app.schemas import (
     ContactCreate, ContactUpdate, ContactRead,
     ContactTagCreate, ContactTagRead,
     ContactNoteCreate, ContactNoteRead,
     ContactReminderCreate, ContactReminderRead
 )
-from app.auth import get_current_user
+from app.auth import get_current_user, CurrentUser
 
 router = APIRouter(prefix="/contacts", tags=["crm"])
 
+CONTACTS_ADAPTER = TypeAdapter(List[ContactRead])
+CONTACT_ADAPTER = TypeAdapter(ContactRead)
+EXPORT_BATCH_SIZE = int(os.getenv("CONTACTS_EXPORT_BATCH", "1000"))
+BULK_MAX_ITEMS = int(os.getenv("CONTACTS_BULK_MAX", "1000"))
+REMINDERS_ADAPTER = TypeAdapter(List[ContactReminderRead])
+
+# Cache da lista de contatos por (user_id, after_id, limit) -> (corpo JSON, ETag).
+# Por processo: as escritas deste worker invalidam na hora; o TTL limita o atraso
+# de escritas feitas em outros workers.
+CONTACTS_CACHE_TTL = int(os.getenv("CONTACTS_CACHE_TTL", "30"))
+_CONTACTS_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=CONTACTS_CACHE_TTL)
+_CONTACTS_CACHE_LOCK = threading.Lock()
+# user_id -> geração da lista; cada invalidação incrementa. Uma leitura só grava no cache
+# se a geração não mudou durante a consulta: senão uma escrita commitada no meio dela
+# (nada a invalidar ainda) deixaria a página antiga em cache até o TTL.
+_CONTACTS_GEN: Dict[int, int] = {}
+
+
+def invalidate_contacts_cache(user_id: int) -> None:
+    """Descarta as páginas em cache da lista de contatos do usuário."""
+    with _CONTACTS_CACHE_LOCK:
+        _CONTACTS_GEN[user_id] = _CONTACTS_GEN.get(user_id, 0) + 1
+        for key in [k for k in _CONTACTS_CACHE.keys() if k[0] == user_id]:
+            _CONTACTS_CACHE.pop(key, None)
+
+# Consultas de posse montadas uma vez no import: cada request só troca os parâmetros
+# e o SQL compilado sai do cache do SQLAlchemy.
+_CONTACT_OWNER = select(Contact.user_id).where(Contact.id == bindparam("cid"))
+_OWNED_CONTACT = select(Contact).where(Contact.id == bindparam("cid"), Contact.user_id == bindparam("uid"))
+_CONTACT_BY_THREAD = select(Contact).where(Contact.thread_id == bindparam("tid"))
+_OWNED_THREAD = select(Thread).where(Thread.id == bindparam("tid"), Thread.user_id == bindparam("uid"))
+_CONTACT_CHILD = {
+    model: select(model).where(
+        model.id == bindparam("id"), model.contact_id == bindparam("cid"), model.user_id == bindparam("uid")
+    )
+    for model in (ContactTag, ContactNote, ContactReminder)
+}
+_TAG_BY_NAME = select(ContactTag).where(ContactTag.contact_id == bindparam("cid"), ContactTag.tag == bindparam("tag"))
+
 
 def _get_or_create_contact(thread_id: int, user_id: int, db: Session) -> Contact:
     """Obtém ou cria um contato para a thread"""
-    contact = db.query(Contact).filter(Contact.thread_id == thread_id).first()
+    contact = db.execute(_CONTACT_BY_THREAD, {"tid": thread_id}).scalar()
     if not contact:
-        thread = db.get(Thread, thread_id)
-        if not thread or thread.user_id != user_id:
+        thread = db.execute(_OWNED_THREAD, {"tid": thread_id, "uid": user_id}).scalar()
+        if not thread:
             raise HTTPException(404, "Thread not found")
         
         # Extrai dados básicos da thread
@@ -35,14 +82,50 @@ def _get_or_create_contact(thread_id: int, user_id: int, db: Session) -> Contact
         )
         db.add(contact)
         db.commit()
-        db.refresh(contact)
+        invalidate_contacts_cache(user_id)
     return contact
 
 
+def _get_contact_child(db: Session, model, child_id: int, contact_id: int, user_id: int):
+    """Busca tag/nota/lembrete do contato validando o dono pelo user_id da própria linha (sem JOIN)"""
+    return db.execute(_CONTACT_CHILD[model], {"id": child_id, "cid": contact_id, "uid": user_id}).scalar()
+
+
+def _insert_contact_child(db: Session, model, contact_id: int, user_id: int, values: dict, *extra_where):
+    """
+    INSERT ... SELECT a partir da linha do contato: valida o dono e insere no mesmo
+    statement (sem SELECT prévio nem janela entre checar e inserir). None se o
+    contato não existir/não for do usuário (ou extra_where barrar).
+    """
+    columns = model.__table__.c
+    stmt = (
+        insert(model)
+        .from_select(
+            ["contact_id", "user_id", *values],
+            select(Contact.id, Contact.user_id, *(literal(v, columns[k].type) for k, v in values.items()))
+            .where(Contact.id == contact_id, Contact.user_id == user_id, *extra_where),
+        )
+        .returning(*columns)
+    )
+    row = db.execute(stmt).mappings().first()
+    return dict(row) if row else None
+
+
+def _delete_contact_child(db: Session, model, child_id: int, contact_id: int, user_id: int) -> bool:
+    """DELETE ... RETURNING com o filtro de dono: sem SELECT prévio. False se nada foi removido."""
+    deleted = db.execute(
+        delete(model)
+        .where(model.id == child_id, model.contact_id == contact_id, model.user_id == user_id)
+        .returning(model.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    return deleted is not None
+
+
 @router.get("/thread/{thread_id}", response_model=ContactRead)
 def get_contact_by_thread(
     thread_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtém contato por thread_id (cria se não existir)"""
@@ -50,25 +133,126 @@ def get_contact_by_thread(
     return contact
 
 
+# ContactRead serializa as três coleções: carrega em lote (1 query cada), não por contato.
+# Com AsyncSession não existe lazy load, então qualquer outro acesso deve falhar alto.
+_CONTACT_LOAD = (
+    selectinload(Contact.tags),
+    selectinload(Contact.notes),
+    selectinload(Contact.reminders),
+    raiseload("*"),
+)
+
+# Lista só de leitura: colunas puras em .mappings() (sem identity map/instrumentação ORM).
+# Montadas uma vez no import; o cache de compilação do SQLAlchemy reaproveita o SQL.
+_CONTACTS_BY_USER = (
+    select(
+        Contact.id, Contact.thread_id, Contact.name, Contact.email, Contact.phone, Contact.company,
+        Contact.total_orders, Contact.total_spent, Contact.average_ticket, Contact.most_bought_products,
+        Contact.last_interaction_at, Contact.created_at, Contact.updated_at,
+    )
+    .where(Contact.user_id == bindparam("uid"))
+    .order_by(Contact.id.desc())
+)
+# Coleções da página inteira: uma consulta por tipo, agrupadas por contact_id em Python
+_CONTACT_COLLECTIONS = (
+    ("tags", select(ContactTag.contact_id, ContactTag.id, ContactTag.tag, ContactTag.created_at)
+        .where(ContactTag.contact_id.in_(bindparam("cids", expanding=True)))
+        .order_by(ContactTag.id)),
+    ("notes", select(ContactNote.contact_id, ContactNote.id, ContactNote.content, ContactNote.created_at, ContactNote.user_id)
+        .where(ContactNote.contact_id.in_(bindparam("cids", expanding=True)))
+        .order_by(ContactNote.created_at.desc())),
+    ("reminders", select(ContactReminder.contact_id, ContactReminder.id, ContactReminder.message, ContactReminder.due_date,
+                         ContactReminder.completed, ContactReminder.created_at)
+        .where(ContactReminder.contact_id.in_(bindparam("cids", expanding=True)))
+        .order_by(ContactReminder.id)),
+)
+
+_CONTACT_BY_ID = (
+    select(Contact)
+    .options(*_CONTACT_LOAD)
+    .where(Contact.id == bindparam("cid"), Contact.user_id == bindparam("uid"))
+)
+
+
 @router.get("", response_model=List[ContactRead])
-def list_contacts(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def list_contacts(
+    request: Request,
+    after_id: Optional[int] = Query(None, description="Último id recebido (página anterior)"),
+    limit: int = Query(50, ge=1, le=200),
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db_ro)
 ):
-    """Lista todos os contatos do usuário"""
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).order_by(desc(Contact.last_interaction_at)).all()
-    return contacts
+    """Lista os contatos do usuário, mais recentes primeiro (paginação por keyset em id)"""
+    key = (user.id, after_id, limit)
+    with _CONTACTS_CACHE_LOCK:
+        cached = _CONTACTS_CACHE.get(key)
+        gen = _CONTACTS_GEN.get(user.id, 0)
+    if cached is None:
+        stmt = _CONTACTS_BY_USER
+        if after_id is not None:
+            stmt = stmt.where(Contact.id < after_id)
+        rows = (await db.execute(stmt.limit(limit), {"uid": user.id})).mappings().all()
+        contacts = [{**row, "tags": [], "notes": [], "reminders": []} for row in rows]
+        if contacts:
+            by_id = {c["id"]: c for c in contacts}
+            for field, child_stmt in _CONTACT_COLLECTIONS:
+                for child in (await db.execute(child_stmt, {"cids": list(by_id)})).mappings():
+                    by_id[child["contact_id"]][field].append(child)
+        # valida a lista inteira de uma vez e já serializa em JSON (pydantic-core)
+        body = CONTACTS_ADAPTER.dump_json(CONTACTS_ADAPTER.validate_python(contacts))
+        cached = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        with _CONTACTS_CACHE_LOCK:
+            if _CONTACTS_GEN.get(user.id, 0) == gen:
+                _CONTACTS_CACHE[key] = cached
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+_CONTACTS_EXPORT = (
+    select(Contact)
+    .options(*_CONTACT_LOAD)
+    .where(Contact.user_id == bindparam("uid"))
+    .order_by(Contact.id)
+    .execution_options(yield_per=EXPORT_BATCH_SIZE)
+)
+
+
+def _export_contacts(user_id: int):
+    # Sessão própria: a do Depends(get_db) fecha antes do fim do streaming
+    with ReadOnlySessionLocal() as db:
+        result = db.execute(_CONTACTS_EXPORT, {"uid": user_id}).scalars()
+        # um lote por vez (yield_per + selectinload por lote); o identity map é fraco,
+        # então cada lote é liberado assim que deixa de ser referenciado
+        for batch in result.partitions():
+            yield b"".join(
+                CONTACT_ADAPTER.dump_json(CONTACT_ADAPTER.validate_python(c, from_attributes=True)) + b"\n"
+                for c in batch
+            )
+
+
+@router.get("/export")
+def export_contacts(user: CurrentUser = Depends(get_current_user)):
+    """Exporta todos os contatos do usuário em NDJSON (um ContactRead por linha), em streaming"""
+    return StreamingResponse(
+        _export_contacts(user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="contacts.ndjson"'},
+    )
 
 
 @router.get("/{contact_id}", response_model=ContactRead)
-def get_contact(
+async def get_contact(
     contact_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db_ro)
 ):
     """Obtém detalhes de um contato"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
+    contact = (await db.execute(_CONTACT_BY_ID, {"cid": contact_id, "uid": user.id})).scalar()
+    if not contact:
         raise HTTPException(404, "Contact not found")
     return contact
 
@@ -76,16 +260,16 @@ def get_contact(
 @router.post("", response_model=ContactRead)
 def create_contact(
     payload: ContactCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Cria um novo contato"""
-    thread = db.get(Thread, payload.thread_id)
-    if not thread or thread.user_id != user.id:
+    thread = db.execute(_OWNED_THREAD, {"tid": payload.thread_id, "uid": user.id}).scalar()
+    if not thread:
         raise HTTPException(404, "Thread not found")
     
     # Verifica se já existe
-    existing = db.query(Contact).filter(Contact.thread_id == payload.thread_id).first()
+    existing = db.execute(_CONTACT_BY_THREAD, {"tid": payload.thread_id}).scalar()
     if existing:
         raise HTTPException(400, "Contact already exists for this thread")
     
@@ -99,33 +283,85 @@ def create_contact(
     )
     db.add(contact)
     db.commit()
-    db.refresh(contact)
+    invalidate_contacts_cache(user.id)
     return contact
 
 
+@router.post("/bulk", response_model=List[ContactRead])
+def bulk_create_contacts(
+    items: List[ContactCreate] = Body(..., max_length=BULK_MAX_ITEMS),
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cria vários contatos de uma vez (importação de listas, até BULK_MAX_ITEMS por chamada)"""
+    if not items:
+        return []
+
+    thread_ids = [item.thread_id for item in items]
+    if len(set(thread_ids)) != len(thread_ids):
+        raise HTTPException(400, "Duplicate thread_id in payload")
+
+    # Valida donos das threads e contatos existentes em duas consultas, não 2 por item
+    phones = dict(
+        db.execute(
+            select(Thread.id, Thread.external_user_phone)
+            .where(Thread.id.in_(thread_ids), Thread.user_id == user.id)
+        ).all()
+    )
+    if len(phones) != len(thread_ids):
+        raise HTTPException(404, "Thread not found")
+    if db.execute(select(Contact.thread_id).where(Contact.thread_id.in_(thread_ids)).limit(1)).first():
+        raise HTTPException(400, "Contact already exists for this thread")
+
+    rows = [
+        {
+            "thread_id": item.thread_id,
+            "user_id": user.id,
+            "name": item.name,
+            "email": item.email,
+            "phone": item.phone or phones[item.thread_id],
+            "company": item.company,
+        }
+        for item in items
+    ]
+    # executemany + RETURNING: o SQLAlchemy agrupa em INSERTs multi-VALUES (insertmanyvalues)
+    try:
+        result = db.execute(insert(Contact).returning(*Contact.__table__.c), rows)
+        created = [ContactRead.model_validate(dict(row)) for row in result.mappings()]
+        db.commit()
+    except IntegrityError:
+        # Outra requisição criou contato para alguma dessas threads depois da checagem acima
+        db.rollback()
+        raise HTTPException(409, "Contact already exists for this thread")
+    invalidate_contacts_cache(user.id)
+    return created
+
+
 @router.patch("/{contact_id}", response_model=ContactRead)
 def update_contact(
     contact_id: int,
     payload: ContactUpdate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Atualiza dados do contato"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
+    changes = payload.model_dump(exclude_none=True)
+    if not changes:
+        contact = db.execute(_OWNED_CONTACT, {"cid": contact_id, "uid": user.id}).scalar()
+    else:
+        # UPDATE ... RETURNING: valida o dono e altera numa única ida ao banco
+        contact = db.execute(
+            update(Contact)
+            .where(Contact.id == contact_id, Contact.user_id == user.id)
+            .values(**changes)
+            .returning(Contact)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+    if not contact:
         raise HTTPException(404, "Contact not found")
     
-    if payload.name is not None:
-        contact.name = payload.name
-    if payload.email is not None:
-        contact.email = payload.email
-    if payload.phone is not None:
-        contact.phone = payload.phone
-    if payload.company is not None:
-        contact.company = payload.company
-    
     db.commit()
-    db.refresh(contact)
+    invalidate_contacts_cache(user.id)
     return contact
 
 
@@ -134,26 +370,23 @@ def update_contact(
 def add_tag(
     contact_id: int,
     payload: ContactTagCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Adiciona tag ao contato"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
+    tag = _insert_contact_child(
+        db, ContactTag, contact_id, user.id, {"tag": payload.tag},
+        ~exists().where(ContactTag.contact_id == contact_id, ContactTag.tag == payload.tag),
+    )
+    if tag is None:
+        # Nada inserido: a tag já existe (devolve a atual) ou o contato não é do usuário
+        existing = db.execute(_TAG_BY_NAME, {"cid": contact_id, "tag": payload.tag}).scalar()
+        if existing and existing.user_id == user.id:
+            return existing
         raise HTTPException(404, "Contact not found")
     
-    # Verifica se já existe
-    existing = db.query(ContactTag).filter(
-        ContactTag.contact_id == contact_id,
-        ContactTag.tag == payload.tag
-    ).first()
-    if existing:
-        return existing
-    
-    tag = ContactTag(contact_id=contact_id, tag=payload.tag)
-    db.add(tag)
     db.commit()
-    db.refresh(tag)
+    invalidate_contacts_cache(user.id)
     return tag
 
 
@@ -161,20 +394,15 @@ def add_tag(
 def remove_tag(
     contact_id: int,
     tag_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Remove tag do contato"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
-        raise HTTPException(404, "Contact not found")
-    
-    tag = db.get(ContactTag, tag_id)
-    if not tag or tag.contact_id != contact_id:
+    if not _delete_contact_child(db, ContactTag, tag_id, contact_id, user.id):
         raise HTTPException(404, "Tag not found")
     
-    db.delete(tag)
     db.commit()
+    invalidate_contacts_cache(user.id)
     return {"ok": True}
 
 
@@ -183,22 +411,16 @@ def remove_tag(
 def add_note(
     contact_id: int,
     payload: ContactNoteCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Adiciona nota ao contato"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
+    note = _insert_contact_child(db, ContactNote, contact_id, user.id, {"content": payload.content})
+    if note is None:
         raise HTTPException(404, "Contact not found")
     
-    note = ContactNote(
-        contact_id=contact_id,
-        user_id=user.id,
-        content=payload.content
-    )
-    db.add(note)
     db.commit()
-    db.refresh(note)
+    invalidate_contacts_cache(user.id)
     return note
 
 
@@ -206,20 +428,15 @@ def add_note(
 def delete_note(
     contact_id: int,
     note_id: int,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Remove nota do contato"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
-        raise HTTPException(404, "Contact not found")
-    
-    note = db.get(ContactNote, note_id)
-    if not note or note.contact_id != contact_id:
+    if not _delete_contact_child(db, ContactNote, note_id, contact_id, user.id):
         raise HTTPException(404, "Note not found")
     
-    db.delete(note)
     db.commit()
+    invalidate_contacts_cache(user.id)
     return {"ok": True}
 
 
@@ -228,23 +445,19 @@ def delete_note(
 def create_reminder(
     contact_id: int,
     payload: ContactReminderCreate,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Cria lembrete de follow-up"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
+    reminder = _insert_contact_child(
+        db, ContactReminder, contact_id, user.id,
+        {"message": payload.message, "due_date": payload.due_date, "completed": False},
+    )
+    if reminder is None:
         raise HTTPException(404, "Contact not found")
     
-    reminder = ContactReminder(
-        contact_id=contact_id,
-        user_id=user.id,
-        message=payload.message,
-        due_date=payload.due_date
-    )
-    db.add(reminder)
     db.commit()
-    db.refresh(reminder)
+    invalidate_contacts_cache(user.id)
     return reminder
 
 
@@ -253,36 +466,68 @@ def update_reminder(
     contact_id: int,
     reminder_id: int,
     completed: Optional[bool] = Query(None),
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Atualiza lembrete (marca como completo)"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
-        raise HTTPException(404, "Contact not found")
-    
-    reminder = db.get(ContactReminder, reminder_id)
-    if not reminder or reminder.contact_id != contact_id:
+    if completed is None:
+        reminder = _get_contact_child(db, ContactReminder, reminder_id, contact_id, user.id)
+    else:
+        reminder = db.execute(
+            update(ContactReminder)
+            .where(
+                ContactReminder.id == reminder_id,
+                ContactReminder.contact_id == contact_id,
+                ContactReminder.user_id == user.id,
+            )
+            .values(completed=completed)
+            .returning(ContactReminder)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+    if not reminder:
         raise HTTPException(404, "Reminder not found")
     
-    if completed is not None:
-        reminder.completed = completed
-    
     db.commit()
-    db.refresh(reminder)
+    invalidate_contacts_cache(user.id)
     return reminder
 
 
+_REMINDERS_BY_CONTACT = (
+    select(
+        ContactReminder.id, ContactReminder.message, ContactReminder.due_date,
+        ContactReminder.completed, ContactReminder.created_at,
+    )
+    .where(ContactReminder.contact_id == bindparam("cid"))
+    .order_by(ContactReminder.due_date, ContactReminder.id)
+)
+
+
 @router.get("/{contact_id}/reminders", response_model=List[ContactReminderRead])
-def list_reminders(
+async def list_reminders(
     contact_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    after_due: Optional[datetime] = Query(None, description="due_date do último lembrete recebido"),
+    after_id: Optional[int] = Query(None, description="id do último lembrete recebido"),
+    completed: Optional[bool] = Query(None, description="false = só pendentes"),
+    limit: int = Query(50, ge=1, le=200),
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db_ro)
 ):
-    """Lista lembretes do contato"""
-    contact = db.get(Contact, contact_id)
-    if not contact or contact.user_id != user.id:
+    """Lista lembretes do contato por vencimento (paginação por keyset em (due_date, id))"""
+    if (after_due is None) != (after_id is None):
+        raise HTTPException(422, "after_due and after_id must be sent together")
+    owner_id = (await db.execute(_CONTACT_OWNER, {"cid": contact_id})).scalar()
+    if owner_id != user.id:
         raise HTTPException(404, "Contact not found")
     
-    return contact.reminders
+    stmt = _REMINDERS_BY_CONTACT
+    if completed is not None:
+        # completed IS false casa com o predicado do índice parcial ix_reminders_contact_pending
+        stmt = stmt.where(ContactReminder.completed.is_(completed))
+    if after_id is not None:
+        stmt = stmt.where(tuple_(ContactReminder.due_date, ContactReminder.id) > (after_due, after_id))
+    rows = (await db.execute(stmt.limit(limit), {"cid": contact_id})).mappings().all()
+    return Response(
+        content=REMINDERS_ADAPTER.dump_json(REMINDERS_ADAPTER.validate_python(rows)),
+        media_type="application/json",
+    )
 
@@ -2,9 +2,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.db import get_db
-from app.models import Thread, Message, User
+from app.models import Thread, Message
 from app.schemas import TakeoverToggle, HumanReplyBody
-from app.auth import get_current_user
+from app.auth import get_current_user, CurrentUser
 
 # ✅ provider Twilio
 from app.providers import twilio as twilio_provider
@@ -13,18 +13,18 @@ router = APIRouter(prefix="/threads", tags=["takeover"])
 
 @router.post("/{thread_id}/takeover")
 def set_takeover(thread_id: int, body: TakeoverToggle,
-                 user: User = Depends(get_current_user),
+                 user: CurrentUser = Depends(get_current_user),
                  db: Session = Depends(get_db)):
     t = db.get(Thread, thread_id)
     if not t or t.user_id != user.id:
         raise HTTPException(404, "Thread not found")
     t.human_takeover = bool(body.active)
-    db.add(t); db.commit(); db.refresh(t)
+    db.add(t); db.commit()
     return {"ok": True, "human_takeover": t.human_takeover}
 
 @router.post("/{thread_id}/human-reply")
 def human_reply(thread_id: int, body: HumanReplyBody,
-                user: User = Depends(get_current_user),
+                user: CurrentUser = Depends(get_current_user),
                 db: Session = Depends(get_db)):
     t = db.get(Thread, thread_id)
     if not t or t.user_id != user.id:
@@ -32,7 +32,7 @@ def human_reply(thread_id: int, body: HumanReplyBody,
 
     # 1) salva no histórico (marcado como mensagem humana)
     msg = Message(thread_id=t.id, role="assistant", content=body.content, is_human=True)
-    db.add(msg); db.commit(); db.refresh(msg)
+    db.add(msg); db.commit()
 
     # 2) envia para o cliente via Twilio
     phone = (t.external_user_phone or "").strip()
@@ -4,8 +4,7 @@ from __future__ import annotations
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from typing import Literal, Optional, List, Dict, Union
-from app.auth import get_current_user
-from app.models import User
+from app.auth import get_current_user, CurrentUser
 
 TaskStatus = Literal["open", "done"]
 
@@ -46,13 +45,13 @@ def _ensure_user_store(uid: int) -> Dict[int, TaskOut]:
 
 # ===== Endpoints =====
 @router.get("", response_model=List[TaskOut])
-def list_tasks(user: User = Depends(get_current_user)):
+def list_tasks(user: CurrentUser = Depends(get_current_user)):
     store = _ensure_user_store(user.id)
     # retorna mais recentes primeiro
     return sorted(store.values(), key=lambda t: int(t.id), reverse=True)
 
 @router.post("", response_model=TaskOut)
-def create_task(payload: TaskCreate, user: User = Depends(get_current_user)):
+def create_task(payload: TaskCreate, user: CurrentUser = Depends(get_current_user)):
     store = _ensure_user_store(user.id)
     tid = _next_id(user.id)
     task = TaskOut(
@@ -66,7 +65,7 @@ def create_task(payload: TaskCreate, user: User = Depends(get_current_user)):
     return task
 
 @router.patch("/{task_id}", response_model=TaskOut)
-def update_task(task_id: int, payload: TaskUpdate, user: User = Depends(get_current_user)):
+def update_task(task_id: int, payload: TaskUpdate, user: CurrentUser = Depends(get_current_user)):
     store = _ensure_user_store(user.id)
     if task_id not in store:
         raise HTTPException(404, "Task not found")
@@ -83,7 +82,7 @@ def update_task(task_id: int, payload: TaskUpdate, user: User = Depends(get_curr
     return updated
 
 @router.delete("/{task_id}", status_code=204)
-def delete_task(task_id: int, user: User = Depends(get_current_user)):
+def delete_task(task_id: int, user: CurrentUser = Depends(get_current_user)):
     store = _ensure_user_store(user.id)
     if task_id not in store:
         raise HTTPException(404, "Task not found")
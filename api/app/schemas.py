@@ -1,10 +1,14 @@
 # api/app/schemas.py
 from datetime import datetime
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Literal
 
 from pydantic import BaseModel, EmailStr, Field
 from pydantic import ConfigDict
 
+# Vocabulários fixos: validação por pertinência (sem regex) e enum no OpenAPI
+MessageRoleName = Literal["user", "assistant", "system"]
+LeadLevel = Literal["frio", "morno", "quente"]
+
 
 # ================== Auth ==================
 class LoginRequest(BaseModel):
@@ -23,7 +27,7 @@ class MessageCreate(BaseModel):
 
 class MessageRead(BaseModel):
     id: int
-    role: str
+    role: MessageRoleName
     content: str
     created_at: datetime
 
@@ -40,7 +44,8 @@ class ThreadUpdate(BaseModel):
     title: Optional[str] = None
     human_takeover: Optional[bool] = None
     origin: Optional[str] = None
-    lead_level: Optional[str] = None
+    # "" limpa o nível (gravado como NULL)
+    lead_level: Optional[LeadLevel | Literal[""]] = None
     lead_score: Optional[int] = None
     # aceita metadata via API; no modelo está em "meta"
     metadata: Optional[Dict[str, Any]] = Field(default=None)
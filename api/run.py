@@ -0,0 +1,20 @@
+# run.py — entrypoint de produção (sem --reload)
+import os
+
+import uvicorn
+
+# Padrão = 1 worker: o hub SSE/WS e o store de tasks vivem em memória por processo,
+# então vários workers só fazem sentido com WEB_CONCURRENCY explícito.
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "app.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=WORKERS,
+        loop="uvloop",       # uvicorn[standard]
+        http="httptools",    # uvicorn[standard]
+        access_log=os.getenv("ACCESS_LOG", "false").lower() == "true",
+        proxy_headers=True,
+    )
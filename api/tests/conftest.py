@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+_DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import hash_password  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.history import THREAD_HIST  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Base, User  # noqa: E402
+from app.routers import crm  # noqa: E402
+
+
+@pytest.fixture()
+def client():
+    # Sem o context manager do TestClient: as migrações de startup são SQL de Postgres.
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(email="dev@local.com", password_hash=hash_password("123")))
+    db.commit()
+    db.close()
+    # Banco recriado a cada teste: os ids recomeçam, então os caches em memória também
+    THREAD_HIST.clear()
+    crm.invalidate_contacts_cache(1)
+    return TestClient(app)
+
+
+@pytest.fixture()
+def auth(client):
+    r = client.post("/auth/login", json={"email": "dev@local.com", "password": "123"})
+    assert r.status_code == 200
+    return {"Authorization": f"Bearer {r.json()['token']}"}
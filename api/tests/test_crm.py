@@ -0,0 +1,137 @@
+def test_create_contact_after_thread(client, auth):
+    tid = client.post("/threads", json={"title": "Lead"}, headers=auth).json()["id"]
+
+    r = client.post("/contacts", json={"thread_id": tid, "name": "Ana"}, headers=auth)
+    assert r.status_code == 200
+    assert r.json()["thread_id"] == tid
+
+
+def test_routes_do_not_trigger_raiseload(client, auth):
+    tid = client.post("/threads", json={"title": "Lead"}, headers=auth).json()["id"]
+    cid = client.post("/contacts", json={"thread_id": tid, "name": "Ana"}, headers=auth).json()["id"]
+    client.post(f"/contacts/{cid}/tags", json={"tag": "vip"}, headers=auth)
+    client.post(f"/contacts/{cid}/notes", json={"content": "oi"}, headers=auth)
+    client.post(
+        f"/contacts/{cid}/reminders",
+        json={"message": "ligar", "due_date": "2026-01-01T10:00:00"},
+        headers=auth,
+    )
+
+    # TestClient repropaga exceções do servidor: um lazy load barrado por raiseload
+    # sobe aqui como InvalidRequestError.
+    threads = client.get("/threads", headers=auth)
+    assert threads.status_code == 200
+    assert threads.json()[0]["contact_name"] == "Ana"
+    assert client.get(f"/threads/{tid}", headers=auth).status_code == 200
+    assert client.get("/contacts", headers=auth).status_code == 200
+    assert client.get(f"/contacts/{cid}", headers=auth).status_code == 200
+    assert client.get(f"/contacts/thread/{tid}", headers=auth).status_code == 200
+    assert client.get(f"/contacts/{cid}/reminders", headers=auth).status_code == 200
+
+
+def test_messages_with_legacy_role_are_readable(client, auth):
+    from sqlalchemy import text
+
+    from app.db import SessionLocal
+    from app.history import thread_history
+
+    tid = client.post("/threads", json={"title": "Lead"}, headers=auth).json()["id"]
+    db = SessionLocal()
+    db.execute(
+        text("INSERT INTO messages (thread_id, role, content, is_human) VALUES (:t, 'agent', 'oi', 0)"),
+        {"t": tid},
+    )
+    db.commit()
+
+    r = client.get(f"/threads/{tid}/messages", headers=auth)
+    assert r.status_code == 200
+    assert [m["role"] for m in r.json()] == ["assistant"]
+    assert [m["role"] for m in thread_history(db, tid)] == ["assistant"]
+    db.close()
+
+
+def test_bulk_create_contacts_limits_and_conflicts(client, auth, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.orm import Session
+
+    from app.routers.crm import BULK_MAX_ITEMS
+
+    tids = [client.post("/threads", json={"title": f"T{i}"}, headers=auth).json()["id"] for i in range(3)]
+
+    r = client.post("/contacts/bulk", json=[{"thread_id": t} for t in tids[:2]], headers=auth)
+    assert r.status_code == 200
+    assert sorted(c["thread_id"] for c in r.json()) == tids[:2]
+
+    too_many = [{"thread_id": i} for i in range(BULK_MAX_ITEMS + 1)]
+    assert client.post("/contacts/bulk", json=too_many, headers=auth).status_code == 422
+
+    # Corrida: outro request cria o contato entre a checagem e o INSERT
+    real_execute = Session.execute
+
+    def racing_execute(self, stmt, *args, **kwargs):
+        if getattr(stmt, "is_insert", False):
+            raise IntegrityError("INSERT", {}, Exception("duplicate key"))
+        return real_execute(self, stmt, *args, **kwargs)
+
+    monkeypatch.setattr(Session, "execute", racing_execute)
+    assert client.post("/contacts/bulk", json=[{"thread_id": tids[2]}], headers=auth).status_code == 409
+
+
+def test_debug_update_contacts_names_invalidates_list_cache(client, auth):
+    client.post("/threads", json={"title": "Ana"}, headers=auth)
+    assert client.get("/contacts", headers=auth).json() == []
+
+    assert client.get("/debug/update-contacts-names").status_code == 200
+    assert [c["name"] for c in client.get("/contacts", headers=auth).json()] == ["Ana"]
+
+
+def test_reminders_keyset_requires_both_cursor_fields(client, auth):
+    tid = client.post("/threads", json={"title": "Lead"}, headers=auth).json()["id"]
+    cid = client.post("/contacts", json={"thread_id": tid}, headers=auth).json()["id"]
+    for day in (3, 1, 2):
+        client.post(
+            f"/contacts/{cid}/reminders",
+            json={"message": f"d{day}", "due_date": f"2026-01-0{day}T10:00:00"},
+            headers=auth,
+        )
+
+    url = f"/contacts/{cid}/reminders"
+    first = client.get(f"{url}?limit=2", headers=auth).json()
+    assert [r["message"] for r in first] == ["d1", "d2"]
+    last = first[-1]
+    rest = client.get(url, params={"after_due": last["due_date"], "after_id": last["id"]}, headers=auth)
+    assert [r["message"] for r in rest.json()] == ["d3"]
+
+    assert client.get(f"{url}?after_id={last['id']}", headers=auth).status_code == 422
+    assert client.get(url, params={"after_due": last["due_date"]}, headers=auth).status_code == 422
+
+
+def test_contacts_list_cache_skips_results_raced_by_a_write(client, auth, monkeypatch):
+    from app.db import SessionLocal
+    from app.models import ContactTag
+    from app.routers import crm
+
+    tid = client.post("/threads", json={"title": "Lead"}, headers=auth).json()["id"]
+    cid = client.post("/contacts", json={"thread_id": tid}, headers=auth).json()["id"]
+
+    # Uma escrita (threadpool) commita e invalida depois das consultas da lista e antes
+    # de o resultado ir para o cache
+    adapter = crm.CONTACTS_ADAPTER
+
+    class RacingAdapter:
+        def validate_python(self, data):
+            db = SessionLocal()
+            db.add(ContactTag(contact_id=cid, user_id=1, tag="vip"))
+            db.commit()
+            db.close()
+            crm.invalidate_contacts_cache(1)
+            return adapter.validate_python(data)
+
+        def dump_json(self, data):
+            return adapter.dump_json(data)
+
+    monkeypatch.setattr(crm, "CONTACTS_ADAPTER", RacingAdapter())
+    assert client.get("/contacts", headers=auth).json()[0]["tags"] == []
+    monkeypatch.setattr(crm, "CONTACTS_ADAPTER", adapter)
+
+    assert [t["tag"] for t in client.get("/contacts", headers=auth).json()[0]["tags"]] == ["vip"]
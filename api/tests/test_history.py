@@ -0,0 +1,23 @@
+def test_history_picks_up_late_committed_messages(client, auth):
+    from app.db import SessionLocal
+    from app.history import thread_history
+    from app.models import Message
+
+    tid = client.post("/threads", json={"title": "Lead"}, headers=auth).json()["id"]
+    db = SessionLocal()
+    db.add_all([
+        Message(id=10, thread_id=tid, role="user", content="a"),
+        Message(id=12, thread_id=tid, role="assistant", content="c"),
+    ])
+    db.commit()
+    assert [m["content"] for m in thread_history(db, tid)] == ["a", "c"]
+
+    # id 11 ficou visível depois do 12 (commit fora de ordem)
+    db.add(Message(id=11, thread_id=tid, role="user", content="b"))
+    db.commit()
+    assert [m["content"] for m in thread_history(db, tid)] == ["a", "b", "c"]
+
+    db.add(Message(id=13, thread_id=tid, role="user", content="d"))
+    db.commit()
+    assert [m["content"] for m in thread_history(db, tid)] == ["a", "b", "c", "d"]
+    db.close()
@@ -291,9 +291,18 @@ export async function getContact(contactId: number): Promise<Contact> {
   return data;
 }
 
-export async function listContacts(): Promise<Contact[]> {
-  const { data } = await api.get<Contact[]>("/contacts");
-  return data;
+// O backend pagina por keyset (after_id + limit); aqui juntamos todas as páginas
+export async function listContacts(pageSize = 200): Promise<Contact[]> {
+  const all: Contact[] = [];
+  let afterId: number | undefined;
+  for (;;) {
+    const { data } = await api.get<Contact[]>("/contacts", {
+      params: { limit: pageSize, after_id: afterId },
+    });
+    all.push(...data);
+    if (data.length < pageSize) return all;
+    afterId = data[data.length - 1].id;
+  }
 }
 
 export async function updateContact(contactId: number, patch: Partial<Contact>): Promise<Contact> {